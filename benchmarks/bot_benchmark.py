@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the bot against a local fake Telegram Bot API server.
+
+The fake server answers Bot API calls, feeds scripted commands through getUpdates,
+serves the monitored "sites" itself and enforces Telegram-like rate limits, so the
+whole run is offline. For every site count it measures per command:
+handler latency, number of outgoing messages, rate-limit (429) hits and event loop lag.
+
+    python benchmarks/bot_benchmark.py --sites 10,100,1000 --commands /list,/status,/check
+    python benchmarks/bot_benchmark.py --sites 10000 --commands /status --alerts 200 --json bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BOT_TOKEN = "123456:BENCHMARK"
+ADMIN_ID = 1000
+CHAT_ID = 1000
+REPORT_CHAT_ID = -1001
+
+# Event loop lag samples kept per scenario (10 minutes of 10 ms timers)
+LAG_WINDOW = 60000
+
+
+class FakeBotAPI:
+    """Minimal Bot API server: getUpdates/sendMessage/... plus fake monitored sites"""
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        self.updates = []
+        self.update_event = asyncio.Event()
+        self.sent = []
+        self.rate_limit_hits = 0
+        self.sites_up = True
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self._windows = {}
+        self._message_id = 0
+
+    def _rate_limited(self, chat_id: str) -> bool:
+        """Sliding one second window per chat and globally"""
+        now = time.monotonic()
+        for key, limit in (("*", self.global_rate), (chat_id, self.chat_rate)):
+            window = [t for t in self._windows.get(key, []) if now - t < 1]
+            self._windows[key] = window
+            if len(window) >= limit:
+                return True
+        self._windows["*"].append(now)
+        self._windows[chat_id].append(now)
+        return False
+
+    def push_command(self, text: str) -> int:
+        update_id = len(self.updates) + 1
+        command_length = len(text.split()[0])
+        self.updates.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": CHAT_ID, "type": "private"},
+                "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "bench"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": command_length}],
+            },
+        })
+        self.update_event.set()
+        return update_id
+
+    def _message(self, chat_id: str, text: str) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private" if not chat_id.startswith("-") else "group"},
+            "text": text,
+        }
+
+    async def handle_api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}})
+
+        if method == "getUpdates":
+            offset = int(data.get("offset", 0) or 0)
+            timeout = float(data.get("timeout", 0) or 0)
+            deadline = time.monotonic() + timeout
+            while True:
+                pending = [update for update in self.updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    return web.json_response({"ok": True, "result": pending})
+                self.update_event.clear()
+                try:
+                    await asyncio.wait_for(self.update_event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = str(data.get("chat_id"))
+            if self._rate_limited(chat_id):
+                self.rate_limit_hits += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }, status=429)
+            self.sent.append((time.monotonic(), chat_id, method, len(data.get("text", ""))))
+            return web.json_response({"ok": True, "result": self._message(chat_id, data.get("text", ""))})
+
+        # deleteWebhook, deleteMessage, close, ...
+        return web.json_response({"ok": True, "result": True})
+
+    async def handle_site(self, request: web.Request) -> web.Response:
+        if self.sites_up:
+            return web.Response(text="<html>ok</html>", content_type="text/html")
+        return web.Response(text="down", status=500, content_type="text/html")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_api)
+        app.router.add_get("/site/{index}", self.handle_site)
+        return app
+
+
+def seed_sites(path: str, count: int, base_url: str):
+    """Writes sites.json with `count` sites served by the fake server"""
+    now = datetime.now().isoformat()
+    sites = {
+        f"site{i:05d}": {
+            "url": f"{base_url}/site/{i}",
+            "added_by": ADMIN_ID,
+            "added_at": now,
+            "expected_content_type": "text/html",
+            "last_check": now,
+            "last_status": 200,
+            "last_response_time": 42.0,
+            "is_up": True,
+            "last_content_type": "text/html",
+        }
+        for i in range(count)
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sites, f)
+
+
+async def run_benchmark(args: argparse.Namespace) -> list:
+    fake = FakeBotAPI(args.server_global_rate, args.server_chat_rate)
+    runner = web.AppRunner(fake.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    data_dir = tempfile.mkdtemp(prefix="down-detector-bench-")
+    os.environ.update({
+        "BOT_TOKEN": BOT_TOKEN,
+        "ADMINS": str(ADMIN_ID),
+        "REPORT_CHAT_ID": str(REPORT_CHAT_ID),
+        "TELEGRAM_API_URL": base_url,
+        "WEBHOOK_URL": "",
+        "TELEGRAM_CHAT_RATE": str(args.chat_rate),
+        "TELEGRAM_GROUP_RATE": str(args.chat_rate),
+        "TELEGRAM_GLOBAL_RATE": str(args.global_rate),
+        "CHECK_CONCURRENCY": str(args.concurrency),
+    })
+
+    # Imported only now so the bot picks up the environment above
+    from src import main as bot_main
+    from src.periodic_checker import check_cycle
+    from src.checker_state import CheckerState
+    from src.diagnostics import LoopLagMonitor
+
+    bot_main.site_monitor.sites_file = os.path.join(data_dir, "sites.json")
+    bot_main.proxy_manager.proxies_file = os.path.join(data_dir, "proxies.json")
+    bot_main.uptime_tracker.uptime_file = os.path.join(data_dir, "uptime.json")
+    await bot_main.proxy_manager.initialize()
+
+    finished = {}
+    finished_event = asyncio.Event()
+
+    async def track_updates(handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            finished[event.update_id] = time.monotonic()
+            finished_event.set()
+
+    bot_main.dp.update.outer_middleware(track_updates)
+    polling = asyncio.create_task(bot_main.dp.start_polling(bot_main.bot, handle_signals=False, polling_timeout=1))
+
+    # 10 ms timer, samples of a whole scenario are kept
+    lag = LoopLagMonitor(interval=0.01, window=LAG_WINDOW)
+    lag.start()
+    results = []
+
+    for site_count in args.sites:
+        seed_sites(bot_main.site_monitor.sites_file, site_count, base_url)
+        await bot_main.site_monitor.load_sites()
+        fake.sites_up = True
+
+        for command in args.commands:
+            latencies, messages, hits = [], [], []
+            lag.reset()
+            for _ in range(args.repeat):
+                sent_before, hits_before = len(fake.sent), fake.rate_limit_hits
+                started = time.monotonic()
+                update_id = fake.push_command(command)
+                while update_id not in finished:
+                    finished_event.clear()
+                    await finished_event.wait()
+                latencies.append((finished[update_id] - started) * 1000)
+                messages.append(len(fake.sent) - sent_before)
+                hits.append(fake.rate_limit_hits - hits_before)
+            results.append({
+                "sites": site_count,
+                "scenario": command,
+                "latency_ms": round(statistics.median(latencies), 1),
+                "latency_max_ms": round(max(latencies), 1),
+                "messages": round(statistics.mean(messages), 1),
+                "rate_limit_hits": sum(hits),
+                **lag.summary(),
+            })
+            print(format_row(results[-1]), flush=True)
+
+        if args.alerts:
+            # Notification burst: the first `alerts` sites go down during one check cycle
+            seed_sites(bot_main.site_monitor.sites_file, min(args.alerts, site_count), base_url)
+            fake.sites_up = False
+            lag.reset()
+            sent_before, hits_before = len(fake.sent), fake.rate_limit_hits
+            started = time.monotonic()
+            # Fresh schedule of a running bot: sites it doesn't know yet are checked in the next cycle
+            checker_state = CheckerState(os.path.join(data_dir, "checker_state.json"))
+            checker_state.restored = True
+            await check_cycle(bot_main.site_monitor, bot_main.proxy_manager, checker_state, 300,
+                              bot_main.uptime_tracker)
+            cycle_ms = (time.monotonic() - started) * 1000
+            # Alerts are queued by the cycle, the max column is the time until the last one is delivered
+            await bot_main.sender.wait_idle(timeout=3600, poll=0.01)
+            results.append({
+                "sites": min(args.alerts, site_count),
+                "scenario": "alerts",
+                "latency_ms": round(cycle_ms, 1),
+                "latency_max_ms": round((time.monotonic() - started) * 1000, 1),
+                "messages": len(fake.sent) - sent_before,
+                "rate_limit_hits": fake.rate_limit_hits - hits_before,
+                **lag.summary(),
+            })
+            print(format_row(results[-1]), flush=True)
+
+    await bot_main.dp.stop_polling()
+    await polling
+    await bot_main.sender.close()
+    await bot_main.bot.session.close()
+    await runner.cleanup()
+    return results
+
+
+HEADER = f"{'sites':>6} {'scenario':<10} {'latency ms':>11} {'max ms':>9} {'msgs':>6} {'429s':>5} {'lag max':>8} {'lag p95':>8}"
+
+
+def format_row(row: dict) -> str:
+    latency_max = "-" if row["latency_max_ms"] is None else row["latency_max_ms"]
+    return (f"{row['sites']:>6} {row['scenario']:<10} {row['latency_ms']:>11} {latency_max:>9} "
+            f"{row['messages']:>6} {row['rate_limit_hits']:>5} {row['lag_max_ms']:>8} {row['lag_p95_ms']:>8}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", default="10,100,1000", help="comma separated site counts")
+    parser.add_argument("--commands", default="/list,/status,/uptime,/check", help="comma separated commands")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each command per site count")
+    parser.add_argument("--alerts", type=int, default=0, help="number of sites going down in the alert burst scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="CHECK_CONCURRENCY of the bot")
+    parser.add_argument("--chat-rate", type=float, default=20, help="bot per-chat send rate, msg/s")
+    parser.add_argument("--global-rate", type=float, default=30, help="bot global send rate, msg/s")
+    parser.add_argument("--server-chat-rate", type=float, default=20, help="fake server per-chat limit, msg/s")
+    parser.add_argument("--server-global-rate", type=float, default=30, help="fake server global limit, msg/s")
+    parser.add_argument("--port", type=int, default=8099, help="port of the fake Bot API server")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+    args.sites = [int(count) for count in args.sites.split(",") if count]
+    args.commands = [command.strip() for command in args.commands.split(",") if command.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Handler logs would dominate the run time with thousands of sites
+    import logging
+    logging.disable(logging.INFO)
+
+    print(HEADER, flush=True)
+    results = asyncio.run(run_benchmark(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
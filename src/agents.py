@@ -0,0 +1,205 @@
+"""
+Remote probe agents.
+
+Agents run the SiteMonitor check loop on other machines: they pull the site list
+from the central bot, check the sites from their own network and push compact
+batches of results back. The central bot merges agent results with its own
+checks before deciding on alerts, so an outage of the bot's own network does
+not look like every site going down.
+"""
+
+import asyncio
+import hmac
+import time
+from typing import Container, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from src.logger import logger
+from src.proxy_manager import ProxyManager
+from src.site_monitor import SiteMonitor
+
+# Fields of one result row in a results batch
+RESULT_FIELDS = ["name", "is_up", "response_time", "status_code", "error_type", "checked_at"]
+
+# Site fields agents need to run checks
+SITE_FIELDS = ["url", "expected_content_type", "timeouts", "retries"]
+
+# Disagreement policies: how local and agent results are combined
+POLICY_MAJORITY = "majority"  # up if most vantage points see it up, a tie keeps the previous state
+POLICY_ANY_DOWN = "any_down"  # down if any vantage point sees it down
+POLICY_ALL_DOWN = "all_down"  # down only if every vantage point sees it down
+POLICIES = (POLICY_MAJORITY, POLICY_ANY_DOWN, POLICY_ALL_DOWN)
+
+# Results per request when pushing to the central bot
+PUSH_BATCH_SIZE = 500
+
+
+class AgentAggregator:
+    """Keeps the latest result of every agent for every site and merges them with local results"""
+
+    def __init__(self, result_ttl: float = 900, policy: str = POLICY_MAJORITY):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown agent policy {policy!r}, expected one of: {', '.join(POLICIES)}")
+        self.result_ttl = result_ttl
+        self.policy = policy
+        # site name -> agent name -> compact result
+        self.reports: Dict[str, Dict[str, Dict]] = {}
+        # agent name -> last time it pushed results
+        self.agents_seen: Dict[str, float] = {}
+
+    def record(self, agent: str, rows: List[List], known_sites: Optional[Container[str]] = None) -> int:
+        """Stores a batch of result rows from an agent, returns number of stored rows.
+        
+        Rows of sites not in `known_sites` are ignored, so an agent can't grow memory with made-up names.
+        """
+        now = time.time()
+        self.agents_seen[agent] = now
+        stored = 0
+        for row in rows:
+            result = dict(zip(RESULT_FIELDS, row))
+            if known_sites is not None and result["name"] not in known_sites:
+                continue
+            result["received_at"] = now
+            self.reports.setdefault(result["name"], {})[agent] = result
+            stored += 1
+        return stored
+
+    def remove_site(self, name: str):
+        """Drops agent results of a removed site"""
+        self.reports.pop(name, None)
+
+    def get_fresh_reports(self, name: str) -> Dict[str, Dict]:
+        """Returns agent results for a site that are not older than result_ttl"""
+        now = time.time()
+        return {
+            agent: result
+            for agent, result in self.reports.get(name, {}).items()
+            if now - result["received_at"] <= self.result_ttl
+        }
+
+    def decide(self, votes: Dict[str, bool], previous_is_up: bool) -> bool:
+        """Combines up/down votes of all vantage points according to the policy"""
+        up_votes = sum(1 for is_up in votes.values() if is_up)
+        down_votes = len(votes) - up_votes
+        if self.policy == POLICY_ANY_DOWN:
+            return down_votes == 0
+        if self.policy == POLICY_ALL_DOWN:
+            return up_votes > 0
+        if up_votes == down_votes:
+            return previous_is_up
+        return up_votes > down_votes
+
+    def merge_results(self, results: List[Dict], sites: Dict[str, Dict], previous: Dict[str, Dict]) -> List[Dict]:
+        """Merges fresh agent results into local check results and site state.
+
+        `previous` is the site state before the local check, used to break ties.
+        Every merged result gets a `vantage_points` map of who saw the site up or down.
+        """
+        for result in results:
+            name = result["name"]
+            agent_reports = self.get_fresh_reports(name)
+            if not agent_reports:
+                continue
+
+            votes = {"local": result["is_up"]}
+            votes.update({agent: bool(report["is_up"]) for agent, report in agent_reports.items()})
+            previous_is_up = previous.get(name, {}).get("is_up", True)
+
+            result["local_is_up"] = result["is_up"]
+            result["vantage_points"] = votes
+            result["is_up"] = self.decide(votes, previous_is_up)
+            if name in sites:
+                sites[name]["is_up"] = result["is_up"]
+                sites[name]["vantage_points"] = votes
+        return results
+
+
+def _authorized(request: web.Request, token: str) -> bool:
+    return hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode())
+
+
+def setup_agent_routes(app: web.Application, aggregator: AgentAggregator, site_monitor: SiteMonitor, token: str):
+    """Adds agent API to an aiohttp application:
+
+    GET  /agent/sites   - site list for agents
+    POST /agent/results - {"agent": name, "fields": [...], "results": [[...], ...]}
+    """
+    async def get_sites(request: web.Request) -> web.Response:
+        if not _authorized(request, token):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        sites = {
+            name: {field: info[field] for field in SITE_FIELDS if field in info}
+            for name, info in site_monitor.get_sites().items()
+        }
+        return web.json_response({"sites": sites})
+
+    async def post_results(request: web.Request) -> web.Response:
+        if not _authorized(request, token):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        try:
+            payload = await request.json()
+            agent = str(payload["agent"])
+            if payload.get("fields", RESULT_FIELDS) != RESULT_FIELDS:
+                return web.json_response({"error": "unsupported result fields"}, status=400)
+            rows = payload["results"]
+            if not all(isinstance(row, list) and len(row) == len(RESULT_FIELDS) for row in rows):
+                raise ValueError("bad result row")
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({"error": "bad request"}, status=400)
+
+        accepted = aggregator.record(agent, rows, site_monitor.get_sites())
+        if accepted < len(rows):
+            logger.warning(f"Agent {agent} sent {len(rows) - accepted} results for unknown sites, ignored")
+        logger.info(f"Received {accepted} results from agent {agent}")
+        return web.json_response({"accepted": accepted, "ignored": len(rows) - accepted})
+
+    app.router.add_get("/agent/sites", get_sites)
+    app.router.add_post("/agent/results", post_results)
+
+
+def to_row(result: Dict) -> List:
+    """Converts a check result to a compact result row"""
+    return [
+        result["name"],
+        1 if result["is_up"] else 0,
+        result.get("response_time"),
+        result.get("status_code"),
+        result.get("error_type"),
+        result.get("checked_at"),
+    ]
+
+
+async def run_agent(central_url: str, token: str, agent_name: str, interval: float = 60,
+                    concurrency: Optional[int] = None, proxies_file: Optional[str] = None):
+    """Agent loop: pull sites, check them, push results, repeat every `interval` seconds"""
+    central_url = central_url.rstrip("/")
+    headers = {"Authorization": f"Bearer {token}"}
+    # Agents check from their own network, proxies are used only if a file is given
+    site_monitor = SiteMonitor()
+    proxy_manager = ProxyManager()
+    if proxies_file:
+        proxy_manager.proxies_file = proxies_file
+        await proxy_manager.load_proxies()
+
+    loop = asyncio.get_running_loop()
+    async with aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        while True:
+            started_at = loop.time()
+            try:
+                async with session.get(f"{central_url}/agent/sites") as response:
+                    response.raise_for_status()
+                    site_monitor.sites = (await response.json())["sites"]
+
+                results = await site_monitor.check_all_sites(proxy_manager, concurrency, save=False, reload=False)
+                rows = [to_row(result) for result in results]
+                for i in range(0, len(rows), PUSH_BATCH_SIZE):
+                    payload = {"agent": agent_name, "fields": RESULT_FIELDS, "results": rows[i:i + PUSH_BATCH_SIZE]}
+                    async with session.post(f"{central_url}/agent/results", json=payload) as response:
+                        response.raise_for_status()
+                logger.info(f"Agent {agent_name}: pushed {len(rows)} results")
+            except Exception as e:
+                logger.error(f"Agent {agent_name}: error talking to central bot: {e}")
+
+            await asyncio.sleep(max(0.0, interval - (loop.time() - started_at)))
@@ -0,0 +1,110 @@
+import json
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import aiofiles
+
+from src.logger import logger
+
+# File for storing checker runtime state between restarts
+STATE_FILE = "./data/checker_state.json"
+
+
+class CheckerState:
+    """Runtime state of the periodic checker that survives restarts.
+
+    Holds per-site schedule (next due time) and consecutive failure counters,
+    alerts that were decided but not delivered yet, and proxy health.
+    """
+
+    def __init__(self, state_file: str = STATE_FILE):
+        self.state_file = state_file
+        self.next_due: Dict[str, float] = {}
+        self.failures: Dict[str, int] = {}
+        self.pending_alerts: List[Dict] = []
+        self.proxy_health: Dict[str, int] = {}
+        self.restored = False
+        # Time of the previous take_due() (or of the restore), sites due before it were missed
+        self.last_taken_at: Optional[float] = None
+
+    async def load(self):
+        """Async loads snapshot from JSON file, missing file means a cold start"""
+        try:
+            async with aiofiles.open(self.state_file, 'r', encoding='utf-8') as f:
+                snapshot = json.loads(await f.read())
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            logger.error(f"Error reading checker state, starting cold: {e}")
+            return
+
+        self.next_due = snapshot.get("next_due", {})
+        self.failures = snapshot.get("failures", {})
+        self.pending_alerts = snapshot.get("pending_alerts", [])
+        self.proxy_health = snapshot.get("proxy_health", {})
+        # Everything overdue at the restore was missed while the bot was down
+        self.last_taken_at = time.time()
+        self.restored = True
+        logger.info(f"Checker state restored: {len(self.next_due)} scheduled sites, "
+                    f"{len(self.pending_alerts)} pending alerts")
+
+    async def save(self):
+        """Async saves snapshot to JSON file"""
+        snapshot = {
+            "saved_at": time.time(),
+            "next_due": {name: round(due, 1) for name, due in self.next_due.items()},
+            "failures": {name: count for name, count in self.failures.items() if count},
+            "pending_alerts": self.pending_alerts,
+            "proxy_health": {name: count for name, count in self.proxy_health.items() if count},
+        }
+        async with aiofiles.open(self.state_file, 'w', encoding='utf-8') as f:
+            await f.write(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')))
+
+    @staticmethod
+    def _spread(name: str, now: float, interval: float) -> float:
+        """Stable due time within the next interval, so sites are spread evenly instead of checked all at once"""
+        return now + (zlib.crc32(name.encode()) % 1000) / 1000 * interval
+
+    def _first_due(self, name: str, now: float, interval: float) -> float:
+        """Due time of a site the schedule doesn't know yet"""
+        if not self.restored:
+            # Cold start: spread sites over one interval
+            return self._spread(name, now, interval)
+        # Site added while running (or since the snapshot): check it right away
+        return now
+
+    def take_due(self, sites: Dict[str, Dict], now: float, interval: float, alert_threshold: int) -> List[str]:
+        """Returns names of sites due for a check and moves their next due time forward.
+
+        Sites that were due before the previous call (i.e. missed while the bot was down)
+        are re-spread over the next interval, so a restart doesn't turn into a burst of checks.
+        """
+        # Forget removed sites
+        for name in list(self.next_due):
+            if name not in sites:
+                del self.next_due[name]
+                self.failures.pop(name, None)
+
+        due = []
+        for name, info in sites.items():
+            next_due = self.next_due.get(name)
+            if next_due is None:
+                next_due = self._first_due(name, now, interval)
+                # Sites not known to the snapshot start from the state saved in sites.json
+                self.failures.setdefault(name, 0 if info.get("is_up", True) else alert_threshold)
+            if self.last_taken_at is not None and next_due <= self.last_taken_at:
+                next_due = self._spread(name, now, interval)
+            elif next_due <= now:
+                due.append(name)
+                missed = int((now - next_due) // interval) + 1
+                next_due += missed * interval
+            self.next_due[name] = next_due
+        self.last_taken_at = now
+        return due
+
+    def seconds_until_next_due(self, now: float) -> float:
+        """Returns seconds until the earliest scheduled check"""
+        if not self.next_due:
+            return float("inf")
+        return max(0.0, min(self.next_due.values()) - now)
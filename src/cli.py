@@ -0,0 +1,144 @@
+"""
+Headless command line interface for the check engine.
+
+Runs site checks without Telegram and prints one JSON object per result (NDJSON):
+
+    python -m src check [--concurrency N] [--tag TAG] [--sites FILE] [--proxies FILE]
+    python -m src daemon [--interval SECONDS] [--profile FILE] ...
+    python -m src agent --central URL --token TOKEN --name NAME [--interval SECONDS]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+
+from src.diagnostics import SamplingProfiler
+from src.logger import logger
+from src import config
+from src.site_monitor import SiteMonitor, SITES_FILE
+from src.proxy_manager import ProxyManager, PROXIES_FILE
+
+
+def write_result(result: dict):
+    """Writes one result as an NDJSON line to stdout"""
+    sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+async def run_sweep(site_monitor: SiteMonitor, proxy_manager: ProxyManager, concurrency: int, save: bool,
+                    tag: str = None) -> int:
+    """Runs one sweep (of sites with `tag` only, if given) streaming results, returns number of unavailable sites.
+    
+    Missing data files are treated as empty; nothing is written unless `save` is set.
+    """
+    await proxy_manager.load_proxies(create=save)
+    await site_monitor.load_sites(create=save)
+    names = site_monitor.get_names_by_tag(tag) if tag else None
+    if tag and not names:
+        logger.warning(f"No sites with tag {tag}")
+    down = 0
+    async for result in site_monitor.iter_check_sites(proxy_manager, concurrency, save=save, reload=False,
+                                                      names=names):
+        write_result(result)
+        if not result["is_up"]:
+            down += 1
+    return down
+
+
+def prepare_data_dirs(args: argparse.Namespace):
+    """Creates directories of the data files when results are written back"""
+    if args.save:
+        for path in (args.sites, args.proxies):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+
+async def run_check(args: argparse.Namespace) -> int:
+    """One-shot sweep, exit code 1 if any site is down"""
+    prepare_data_dirs(args)
+    site_monitor = SiteMonitor(args.sites)
+    proxy_manager = ProxyManager(args.proxies)
+    down = await run_sweep(site_monitor, proxy_manager, args.concurrency, args.save, args.tag)
+    return 1 if down else 0
+
+
+async def run_daemon(args: argparse.Namespace) -> int:
+    """Repeats sweeps every `interval` seconds until interrupted"""
+    prepare_data_dirs(args)
+    site_monitor = SiteMonitor(args.sites)
+    proxy_manager = ProxyManager(args.proxies)
+    while True:
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        try:
+            await run_sweep(site_monitor, proxy_manager, args.concurrency, args.save, args.tag)
+        except Exception as e:
+            logger.error(f"Error during sweep: {e}")
+        # Keep a fixed cadence regardless of sweep duration
+        await asyncio.sleep(max(0.0, args.interval - (loop.time() - started_at)))
+
+
+async def run_agent_mode(args: argparse.Namespace) -> int:
+    """Remote probe agent reporting to the central bot"""
+    from src.agents import run_agent
+    await run_agent(args.central, args.token, args.name, args.interval, args.concurrency, args.proxies)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src", description="Down Detector check engine")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(subparser: argparse.ArgumentParser):
+        subparser.add_argument("--sites", default=SITES_FILE, help="path to sites.json")
+        subparser.add_argument("--proxies", default=PROXIES_FILE, help="path to proxies.json")
+        subparser.add_argument("--concurrency", type=int, default=config.CHECK_CONCURRENCY,
+                               help="number of sites checked at the same time")
+        subparser.add_argument("--tag", default=None, help="check only sites with this tag")
+        subparser.add_argument("--save", action="store_true",
+                               help="write check results back to the sites file")
+        subparser.add_argument("--quiet", action="store_true", help="log only warnings and errors")
+        subparser.add_argument("--profile", metavar="FILE", default=None,
+                               help="sample CPU profile while running: summary to stderr, collapsed stacks to FILE")
+
+    add_common(subparsers.add_parser("check", help="check all sites once"))
+    daemon_parser = subparsers.add_parser("daemon", help="check all sites periodically")
+    add_common(daemon_parser)
+    daemon_parser.add_argument("--interval", type=float, default=300, help="seconds between sweeps")
+
+    agent_parser = subparsers.add_parser("agent", help="run as a remote probe agent of the central bot")
+    agent_parser.add_argument("--central", required=True, help="base URL of the central bot web server")
+    agent_parser.add_argument("--token", required=True, help="AGENT_TOKEN of the central bot")
+    agent_parser.add_argument("--name", default=socket.gethostname(), help="agent name (vantage point)")
+    agent_parser.add_argument("--interval", type=float, default=60, help="seconds between sweeps")
+    agent_parser.add_argument("--concurrency", type=int, default=config.CHECK_CONCURRENCY,
+                              help="number of sites checked at the same time")
+    agent_parser.add_argument("--proxies", default=None, help="optional proxies.json used by the agent")
+    agent_parser.add_argument("--quiet", action="store_true", help="log only warnings and errors")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    profiler = None
+    if getattr(args, "profile", None):
+        profiler = SamplingProfiler()
+        profiler.start()
+
+    commands = {"check": run_check, "daemon": run_daemon, "agent": run_agent_mode}
+    try:
+        return asyncio.run(commands[args.command](args))
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if profiler:
+            profiler.stop()
+            sys.stderr.write(profiler.format_summary() + "\n")
+            with open(args.profile, "w", encoding="utf-8") as f:
+                f.write(profiler.format_collapsed())
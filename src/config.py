@@ -7,3 +7,41 @@ MODE = getenv("MODE", "production")
 BOT_TOKEN = getenv("BOT_TOKEN")
 REPORT_CHAT_ID = getenv("REPORT_CHAT_ID")
 ADMINS = getenv("ADMINS", "").replace(' ', '').split(',')
+
+# Outbound Telegram rate limits (messages per second)
+TELEGRAM_GLOBAL_RATE = float(getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = float(getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GROUP_RATE = float(getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_MAX_RETRIES = int(getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+# Number of sites checked at the same time
+CHECK_CONCURRENCY = int(getenv("CHECK_CONCURRENCY", "10"))
+
+# Webhook mode (long polling is used when WEBHOOK_URL is empty)
+WEBHOOK_URL = getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = getenv("WEBHOOK_SECRET", "")
+WEBAPP_HOST = getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(getenv("WEBAPP_PORT", "8080"))
+
+# Custom Bot API server (local Bot API server or a fake one for testing)
+TELEGRAM_API_URL = getenv("TELEGRAM_API_URL", "")
+
+# Days before TLS certificate expiry to send a warning
+CERT_EXPIRY_WARN_DAYS = int(getenv("CERT_EXPIRY_WARN_DAYS", "14"))
+
+# Remote probe agents (agent API is enabled when AGENT_TOKEN is set)
+AGENT_TOKEN = getenv("AGENT_TOKEN", "")
+AGENT_RESULT_TTL = float(getenv("AGENT_RESULT_TTL", "900"))
+AGENT_POLICY = getenv("AGENT_POLICY", "majority")
+
+# Consecutive failed checks before a site is reported down
+ALERT_AFTER_FAILURES = int(getenv("ALERT_AFTER_FAILURES", "1"))
+
+# Notification routing by site tag: "tag:chat_id,tag:chat_id" (other sites report to REPORT_CHAT_ID)
+TAG_CHATS = dict(
+    item.split(":", 1) for item in getenv("TAG_CHATS", "").replace(' ', '').lower().split(',') if ":" in item
+)
+
+# Seconds a check result may be reused by /check instead of checking the site again
+CHECK_CACHE_TTL = float(getenv("CHECK_CACHE_TTL", "30"))
@@ -0,0 +1,299 @@
+"""
+Runtime diagnostics: sampling CPU profiler, tracemalloc snapshots, asyncio task and event loop lag stats.
+
+Everything here works inside the running process (bot or CLI), no debugger or extra packages needed.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+# Seconds between stack samples of the profiled thread
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Deepest stack walked per sample
+MAX_STACK_DEPTH = 128
+
+# Frames kept per allocation by tracemalloc (more frames - more overhead)
+TRACEMALLOC_FRAMES = 1
+
+# Longest time-based profile and how long to wait for requested check cycles, in seconds
+MAX_PROFILE_SECONDS = 300
+PROFILE_CYCLES_TIMEOUT = 900
+
+# Functions of the event loop waiting for I/O, shown as idle time
+IDLE_FUNCTIONS = {"selectors.py:select", "selectors.py:poll"}
+
+
+def _frame_label(code) -> str:
+    """Returns short label of a function: last two path parts and name, e.g. src/site_monitor.py:check_site"""
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{'/'.join(parts[-2:])}:{code.co_name}"
+
+
+def _is_idle(label: str) -> bool:
+    return label.split("/")[-1] in IDLE_FUNCTIONS
+
+
+class SamplingProfiler:
+    """Statistical profiler: a background thread periodically records the stack of the profiled thread.
+
+    Unlike cProfile it doesn't slow down the profiled code, so it can run in production.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        # Samples where a function is on top of the stack / anywhere in the stack
+        self.self_samples: Counter = Counter()
+        self.total_samples: Counter = Counter()
+        # Collapsed stacks ("outer;inner;leaf" -> samples) for flame graphs
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._active = threading.Event()
+        self._stopped = threading.Event()
+        self._resumed_at = None
+        self._thread = None
+
+    def start(self, paused: bool = False):
+        """Starts the sampling thread"""
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        if not paused:
+            self.resume()
+
+    def resume(self):
+        """Continues sampling after pause()"""
+        if not self._active.is_set():
+            self._resumed_at = time.perf_counter()
+            self._active.set()
+
+    def pause(self):
+        """Stops sampling until resume(), the sampling thread keeps running"""
+        if self._active.is_set() and not self._stopped.is_set():
+            self._active.clear()
+            self.duration += time.perf_counter() - self._resumed_at
+
+    def stop(self):
+        """Stops sampling and waits for the sampling thread to finish"""
+        self.pause()
+        self._stopped.set()
+        self._active.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if not self._active.wait(0.5) or self._stopped.is_set():
+                continue
+            self._sample()
+            time.sleep(self.interval)
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if not labels:
+            return
+        self.samples += 1
+        self.self_samples[labels[0]] += 1
+        for label in set(labels):
+            self.total_samples[label] += 1
+        self.stacks[";".join(reversed(labels))] += 1
+
+    def format_collapsed(self) -> str:
+        """Returns collapsed stacks, one "frame;frame;frame count" line per stack (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def format_summary(self, top: int = 15) -> str:
+        """Returns text report with hot spots: self time of all functions and total time of project functions"""
+        if not self.samples:
+            return "No samples collected"
+        ms_per_sample = self.duration * 1000 / self.samples
+        idle = sum(count for label, count in self.self_samples.items() if _is_idle(label))
+
+        def line(label: str, count: int) -> str:
+            return f"{count * 100 / self.samples:5.1f}% {count * ms_per_sample:8.0f} ms  {label}"
+
+        lines = [
+            f"Samples: {self.samples} over {self.duration:.1f} s, "
+            f"idle (waiting for I/O): {idle * 100 / self.samples:.1f}%",
+            "",
+            "Self time (function on top of the stack):",
+        ]
+        busy = [(label, count) for label, count in self.self_samples.most_common() if not _is_idle(label)]
+        lines += [line(label, count) for label, count in busy[:top]]
+        lines += ["", "Total time of project functions (including callees):"]
+        project = [(label, count) for label, count in self.total_samples.most_common() if label.startswith("src/")]
+        lines += [line(label, count) for label, count in project[:top]]
+        return "\n".join(lines)
+
+
+class CycleProfiler:
+    """Profiles the next N periodic check cycles on request"""
+
+    def __init__(self):
+        self.profiler: Optional[SamplingProfiler] = None
+        self.cycles = 0
+        self._cycles_left = 0
+        # Whether the current cycle started after request(), i.e. was sampled from the beginning
+        self._cycle_sampled = False
+        self._future: Optional[asyncio.Future] = None
+
+    @property
+    def running(self) -> bool:
+        return self.profiler is not None
+
+    def request(self, cycles: int) -> asyncio.Future:
+        """Starts profiling from the next cycle, the future gets the profiler after `cycles` cycles"""
+        if self.running:
+            raise RuntimeError("profiling is already running")
+        self.profiler = SamplingProfiler()
+        self.profiler.start(paused=True)
+        self.cycles = 0
+        self._cycles_left = cycles
+        self._cycle_sampled = False
+        self._future = asyncio.get_running_loop().create_future()
+        return self._future
+
+    def cancel(self):
+        """Stops profiling without a result"""
+        if self.running:
+            self.profiler.stop()
+            self.profiler = None
+            if not self._future.done():
+                self._future.cancel()
+
+    def cycle_started(self):
+        if self.running:
+            self._cycle_sampled = True
+            self.profiler.resume()
+
+    def cycle_finished(self, counted: bool = True):
+        """Pauses sampling between cycles; cycles that checked nothing or were running at request() are not counted"""
+        if not self.running:
+            return
+        self.profiler.pause()
+        sampled, self._cycle_sampled = self._cycle_sampled, False
+        if counted and sampled:
+            self.cycles += 1
+            self._cycles_left -= 1
+        if self._cycles_left <= 0:
+            profiler, self.profiler = self.profiler, None
+            profiler.stop()
+            if not self._future.done():
+                self._future.set_result(profiler)
+
+
+class MemoryTracker:
+    """tracemalloc snapshots: top allocations and growth since the previous snapshot"""
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """Starts tracing allocations and takes the baseline snapshot"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.snapshot = self._take_snapshot()
+
+    def stop(self):
+        """Stops tracing and frees its memory"""
+        tracemalloc.stop()
+        self.snapshot = None
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def format_report(self, top: int = 10) -> str:
+        """Takes a snapshot, returns top allocations and diff with the previous snapshot (which it replaces)"""
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self._take_snapshot()
+        lines = [f"Traced memory: {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB", "",
+                 "Top allocations:"]
+        lines += [f"{stat.size / 1024:10.1f} KiB {stat.count:8d}  {stat.traceback[0]}"
+                  for stat in snapshot.statistics("lineno")[:top]]
+        if self.snapshot is not None:
+            lines += ["", "Growth since previous snapshot:"]
+            lines += [f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d}  {stat.traceback[0]}"
+                      for stat in snapshot.compare_to(self.snapshot, "lineno")[:top]]
+        self.snapshot = snapshot
+        return "\n".join(lines)
+
+
+class LoopLagMonitor:
+    """Measures how late a timer fires, i.e. how long the event loop was blocked"""
+
+    def __init__(self, interval: float = 0.5, window: int = 600):
+        self.interval = interval
+        # Lags of the last `window` timers, in milliseconds
+        self.samples = deque(maxlen=window)
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((loop.time() - started - self.interval) * 1000)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self):
+        """Forgets collected samples, e.g. to measure lag of one scenario"""
+        self.samples.clear()
+
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"lag_p50_ms": 0.0, "lag_p95_ms": 0.0, "lag_max_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "lag_p50_ms": round(ordered[len(ordered) // 2], 2),
+            "lag_p95_ms": round(ordered[int(len(ordered) * 0.95) - 1 if len(ordered) > 1 else 0], 2),
+            "lag_max_ms": round(ordered[-1], 2),
+        }
+
+
+def count_tasks() -> List[tuple]:
+    """Returns (coroutine name, number of tasks) for all tasks of the running loop, most common first"""
+    counts = Counter(
+        getattr(task.get_coro(), "__qualname__", type(task.get_coro()).__name__)
+        for task in asyncio.all_tasks()
+    )
+    return counts.most_common()
+
+
+def format_runtime_stats(lag_monitor: Optional[LoopLagMonitor] = None, top: int = 15) -> str:
+    """Returns text report with asyncio task counts, event loop lag and threads"""
+    tasks = count_tasks()
+    lines = [f"Asyncio tasks: {sum(count for _, count in tasks)}"]
+    lines += [f"{count:6d}  {name}" for name, count in tasks[:top]]
+    if lag_monitor is not None:
+        lag = lag_monitor.summary()
+        lines += ["", f"Event loop lag over last {len(lag_monitor.samples)} samples: "
+                      f"p50 {lag['lag_p50_ms']} ms, p95 {lag['lag_p95_ms']} ms, max {lag['lag_max_ms']} ms"]
+    lines += ["", f"Threads: {threading.active_count()}"]
+    return "\n".join(lines)
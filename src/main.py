@@ -1,14 +1,27 @@
 import asyncio
+import html
+import math
 from datetime import datetime
 
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 from aiogram.filters import Command, BaseFilter
-from aiogram.types import Message
+from aiogram.methods import SendDocument, SendMessage
+from aiogram.types import BufferedInputFile, Message
 
 from src import config
 from src.site_monitor import SiteMonitor
 from src.proxy_manager import ProxyManager
-from src.periodic_checker import periodic_check
+from src.uptime import UptimeTracker, PERIODS
+from src.probes import PROBE_HTTP, get_probe_type, validate_address
+from src.periodic_checker import periodic_check, flush_state, format_regions, cycle_profiler
+from src.diagnostics import (
+    MAX_PROFILE_SECONDS, PROFILE_CYCLES_TIMEOUT,
+    LoopLagMonitor, MemoryTracker, SamplingProfiler, format_runtime_stats
+)
+from src.checker_state import CheckerState
+from src.telegram_client import bot, sender, PRIORITY_REPORT
+from src.webhook import create_app, run_webhook, start_web_app
+from src.agents import AgentAggregator, setup_agent_routes
 from src.logger import logger
 
 class AdminFilter(BaseFilter):
@@ -49,10 +62,10 @@ def get_content_type_emoji(content_type: str) -> str:
     else:
         return "📄"
 
-async def send_long_message(bot: Bot, chat_id: int, text: str, max_length: int = 4000):
+async def send_long_message(chat_id: int, text: str, max_length: int = 4000, priority: int = PRIORITY_REPORT):
     """Split and send long messages that exceed Telegram's limit"""
     if len(text) <= max_length:
-        await bot.send_message(chat_id, text)
+        await sender.send_message(chat_id, text, priority=priority)
         return
     
     # Split text into parts
@@ -72,7 +85,8 @@ async def send_long_message(bot: Bot, chat_id: int, text: str, max_length: int =
     if current_part.strip():
         parts.append(current_part.strip())
     
-    # Send all parts
+    # Queue all parts at once, the sender keeps their order and paces them
+    futures = []
     for i, part in enumerate(parts):
         if len(parts) > 1:
             # Add part number for multi-part messages
@@ -80,12 +94,45 @@ async def send_long_message(bot: Bot, chat_id: int, text: str, max_length: int =
         else:
             part_text = part
         
-        await bot.send_message(chat_id, part_text)
-        # Small delay between messages to avoid rate limiting
-        await asyncio.sleep(0.1)
+        futures.append(sender.submit(SendMessage(chat_id=chat_id, text=part_text), priority))
+    await asyncio.gather(*futures)
 
-# Bot and dispatcher initialization
-bot = Bot(token=config.BOT_TOKEN, parse_mode="HTML")
+def get_probe_info(url: str, expected_content_type: str) -> str:
+    """Returns report line with expected content type (HTTP) or probe type (TCP/TLS/DNS)"""
+    probe_type = get_probe_type(url)
+    if probe_type != PROBE_HTTP:
+        return f"   🔌 Тип проверки: {probe_type.upper()}\n"
+    content_emoji = "🌐"
+    if expected_content_type == "application/json":
+        content_emoji = "📋"
+    elif expected_content_type.startswith("text/"):
+        content_emoji = "📄"
+    return f"   {content_emoji} Ожидаемый тип: {expected_content_type}\n"
+
+def get_cert_info(days_left: int) -> str:
+    """Returns report line with TLS certificate expiry"""
+    cert_emoji = "🔒" if days_left > config.CERT_EXPIRY_WARN_DAYS else "⚠️"
+    return f"   {cert_emoji} Сертификат истекает через {days_left} дн.\n"
+
+def get_tags_info(tags: list) -> str:
+    """Returns report line with site tags"""
+    return f"   🏷 Теги: {' '.join('#' + tag for tag in tags)}\n"
+
+def format_duration(seconds: float) -> str:
+    """Returns human readable duration, e.g. 2д 3ч or 5м 10с"""
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days}д {hours}ч"
+    if hours:
+        return f"{hours}ч {minutes}м"
+    if minutes:
+        return f"{minutes}м {seconds}с"
+    return f"{seconds}с"
+
+# Dispatcher initialization (bot is shared with the periodic checker)
 dp = Dispatcher()
 
 dp.message.filter(admin_filter)
@@ -93,6 +140,21 @@ dp.message.filter(admin_filter)
 # Create monitor instances
 site_monitor = SiteMonitor()
 proxy_manager = ProxyManager()
+uptime_tracker = UptimeTracker()
+agent_aggregator = AgentAggregator(config.AGENT_RESULT_TTL, config.AGENT_POLICY)
+checker_state = CheckerState()
+loop_lag_monitor = LoopLagMonitor()
+memory_tracker = MemoryTracker()
+
+async def get_target_names(message: Message, target: str) -> list:
+    """Returns [name] if target is a site name, else names of sites with such tag; replies with an error if none"""
+    target = target.strip().lower()
+    if target in site_monitor.get_sites():
+        return [target]
+    names = site_monitor.get_names_by_tag(target)
+    if not names:
+        await sender.send_message(message.chat.id, f"❌ Сайт или тег <b>{target}</b> не найден!\n\nСписок тегов: /tags")
+    return names
 
 @dp.message(Command("start"))
 async def cmd_start(message: Message):
@@ -101,11 +163,16 @@ async def cmd_start(message: Message):
 🤖 <b>DOWN DETECTOR</b>
 
 <b>Доступные команды:</b>
-• /add &lt;название&gt; &lt;url&gt; [content-type] - добавить сайт для мониторинга
+• /add &lt;название&gt; &lt;url&gt; [content-type] [#теги] - добавить сайт для мониторинга
 • /remove &lt;название&gt; - удалить сайт из мониторинга
 • /list - показать все отслеживаемые сайты
-• /check - проверить все сайты сейчас
-• /status - показать статус всех сайтов
+• /check [название|#тег] - проверить все сайты, один сайт или сайты с тегом сейчас
+• /status [название|#тег] - показать статус всех сайтов, одного сайта или сайтов с тегом
+• /tag #тег &lt;названия&gt; / /untag #тег [названия] - теги для групп сайтов
+• /tags - показать теги и их сайты
+• /uptime [название] [1h|24h|7d|30d] - доступность (SLA) за период
+• /regions &lt;название&gt; [страны] - проверять сайт из нескольких стран
+• /timeout &lt;название&gt; [total=с] [connect=с] [read=с] [retries=n] - таймауты и повторы
 
 <b>Команды для прокси:</b>
 • /proxy_add &lt;название&gt; &lt;url&gt; &lt;страна&gt; - добавить прокси
@@ -113,6 +180,16 @@ async def cmd_start(message: Message):
 • /proxy_list - показать все прокси
 • /proxy_test &lt;название&gt; - протестировать прокси
 
+<b>Диагностика:</b>
+• /profile [циклы | секунды + s] - профиль CPU следующих циклов проверки или за время
+• /memory [start|stop] - снимки памяти (tracemalloc) и рост с прошлого снимка
+• /tasks - задачи asyncio, задержка event loop и очередь Telegram
+
+<b>Легкие проверки (без HTTP-запроса):</b>
+• tcp://host:port - TCP-соединение с портом
+• tls://host[:port] - TLS-рукопожатие и срок действия сертификата
+• dns://host - разрешение DNS-имени
+
 <b>Поддерживаемые типы контента:</b>
 • 🌐 HTML страницы (text/html) - по умолчанию
 • 📋 JSON API (application/json)
@@ -122,46 +199,58 @@ async def cmd_start(message: Message):
 • /add google https://google.com
 • /add api_ping https://api.example.com/ping application/json
 • /add text_api https://api.example.com/status text/plain
+• /add db tcp://db.example.com:5432
+• /add cert tls://example.com
+• /add billing https://billing.example.com #payments
+• /check #payments
+• /check google
 • /proxy_add us_proxy http://proxy.example.com:8080 us
+• /regions google ru de us
+• /timeout api_ping total=30 connect=3 retries=2
 • /remove google
     """
     
-    await message.answer(welcome_text)
+    await sender.send_message(message.chat.id, welcome_text)
 
 @dp.message(Command("add"))
 async def cmd_add_site(message: Message):
     """Command for adding a site"""
     try:
-        # Parse command: /add name url [content-type]
-        parts = message.text.split(maxsplit=3)
+        # Parse command: /add name url [content-type] [#tag ...]
+        parts = [part for part in message.text.split() if not part.startswith("#")]
+        tags = [part for part in message.text.split()[1:] if part.startswith("#")]
         if len(parts) < 3:
-            await message.answer("❌ Неправильный формат команды!\n\nИспользуйте: /add &lt;название&gt; &lt;url&gt; [content-type]\n\nПримеры:\n• /add google https://google.com\n• /add api_ping https://api.example.com/ping application/json\n• /add text_api https://api.example.com/status text/plain")
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /add &lt;название&gt; &lt;url&gt; [content-type] [#теги]\n\nПримеры:\n• /add google https://google.com\n• /add billing https://billing.example.com #payments #team-a\n• /add api_ping https://api.example.com/ping application/json\n• /add text_api https://api.example.com/status text/plain\n• /add db tcp://db.example.com:5432\n• /add cert tls://example.com\n• /add dns dns://example.com")
             return
         
         name = parts[1].lower()
         url = parts[2]
-        expected_content_type = parts[3] if len(parts) > 3 else "text/html"
+        expected_content_type = " ".join(parts[3:]) or "text/html"
         
         # Check URL format
-        if not url.startswith(('http://', 'https://')):
+        if not url.startswith(('http://', 'https://', 'tcp://', 'tls://', 'dns://')):
             url = 'https://' + url
+        try:
+            validate_address(url)
+        except ValueError as e:
+            await sender.send_message(message.chat.id, f"❌ Неправильный адрес: {html.escape(str(e))}")
+            return
         
         # Add site
-        if await site_monitor.add_site(name, url, message.from_user.id, expected_content_type):
-            content_emoji = "🌐"
-            if expected_content_type == "application/json":
-                content_emoji = "📋"
-            elif expected_content_type.startswith("text/"):
-                content_emoji = "📄"
-            
-            response_text = f"✅ Сайт <b>{name}</b> успешно добавлен для мониторинга!\n\nURL: {url}\n{content_emoji} Ожидаемый тип: {expected_content_type}\n🔄 При каждой проверке будет использоваться случайный прокси"
-            await message.answer(response_text)
+        if await site_monitor.add_site(name, url, message.from_user.id, expected_content_type, tags):
+            response_text = f"✅ Сайт <b>{name}</b> успешно добавлен для мониторинга!\n\nURL: {url}\n"
+            response_text += get_probe_info(url, expected_content_type).strip() + "\n"
+            if tags:
+                response_text += get_tags_info(site_monitor.get_sites()[name]["tags"]).strip() + "\n"
+            if get_probe_type(url) == PROBE_HTTP:
+                response_text += "🔄 При каждой проверке будет использоваться случайный прокси"
+            await sender.send_message(message.chat.id, response_text)
         else:
-            await message.answer(f"❌ Сайт с названием <b>{name}</b> уже существует!")
+            await sender.send_message(message.chat.id, f"❌ Сайт с названием <b>{name}</b> уже существует!")
     
     except Exception as e:
         logger.error(f"Error adding site: {e}")
-        await message.answer("❌ Произошла ошибка при добавлении сайта")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при добавлении сайта")
 
 @dp.message(Command("remove"))
 async def cmd_remove_site(message: Message):
@@ -169,19 +258,22 @@ async def cmd_remove_site(message: Message):
     try:
         parts = message.text.split(maxsplit=1)
         if len(parts) < 2:
-            await message.answer("❌ Неправильный формат команды!\n\nИспользуйте: /remove &lt;название&gt;\n\nПример: /remove google")
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /remove &lt;название&gt;\n\nПример: /remove google")
             return
         
         name = parts[1].lower()
         
         if await site_monitor.remove_site(name):
-            await message.answer(f"✅ Сайт <b>{name}</b> удален из мониторинга!")
+            uptime_tracker.remove_site(name)
+            agent_aggregator.remove_site(name)
+            await uptime_tracker.save()
+            await sender.send_message(message.chat.id, f"✅ Сайт <b>{name}</b> удален из мониторинга!")
         else:
-            await message.answer(f"❌ Сайт с названием <b>{name}</b> не найден!")
+            await sender.send_message(message.chat.id, f"❌ Сайт с названием <b>{name}</b> не найден!")
     
     except Exception as e:
         logger.error(f"Error removing site: {e}")
-        await message.answer("❌ Произошла ошибка при удалении сайта")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при удалении сайта")
 
 @dp.message(Command("list"))
 async def cmd_list_sites(message: Message):
@@ -189,7 +281,7 @@ async def cmd_list_sites(message: Message):
     sites = site_monitor.get_sites()
     
     if not sites:
-        await message.answer("📝 Список отслеживаемых сайтов пуст.\n\nДобавьте первый сайт командой /add &lt;название&gt; &lt;url&gt;")
+        await sender.send_message(message.chat.id, "📝 Список отслеживаемых сайтов пуст.\n\nДобавьте первый сайт командой /add &lt;название&gt; &lt;url&gt;")
         return
     
     sites_text = "📝 <b>Отслеживаемые сайты:</b>\n\n"
@@ -202,14 +294,10 @@ async def cmd_list_sites(message: Message):
         sites_text += f"{status_emoji} <b>{name}</b>\n"
         sites_text += f"   URL: {info['url']}\n"
         
-        # Add expected content type
-        expected_content_type = info.get("expected_content_type", "text/html")
-        content_emoji = "🌐"
-        if expected_content_type == "application/json":
-            content_emoji = "📋"
-        elif expected_content_type.startswith("text/"):
-            content_emoji = "📄"
-        sites_text += f"   {content_emoji} Ожидаемый тип: {expected_content_type}\n"
+        # Add expected content type or probe type
+        sites_text += get_probe_info(info['url'], info.get("expected_content_type", "text/html"))
+        if info.get("tags"):
+            sites_text += get_tags_info(info["tags"])
         sites_text += f"   Последняя проверка: {last_check}\n"
         
         # Add actual content type information
@@ -226,22 +314,33 @@ async def cmd_list_sites(message: Message):
         
         sites_text += "\n"
     
-    await send_long_message(bot, message.chat.id, sites_text)
+    await send_long_message(message.chat.id, sites_text)
 
 @dp.message(Command("check"))
 async def cmd_check_sites(message: Message):
-    """Command for checking all sites"""
+    """Command for checking all sites, one site or sites with a tag"""
     sites = site_monitor.get_sites()
     
     if not sites:
-        await message.answer("📝 Нет сайтов для проверки.\n\nДобавьте сайты командой /add &lt;название&gt; &lt;url&gt;")
+        await sender.send_message(message.chat.id, "📝 Нет сайтов для проверки.\n\nДобавьте сайты командой /add &lt;название&gt; &lt;url&gt;")
         return
     
+    # Parse command: /check [name|tag]
+    parts = message.text.split(maxsplit=1)
+    names = None
+    if len(parts) > 1:
+        names = await get_target_names(message, parts[1])
+        if not names:
+            return
+    
     # Send message about start of checking
-    status_msg = await message.answer("🔍 Checking site availability...")
+    status_msg = await sender.send_message(message.chat.id, "🔍 Checking site availability...")
     
-    # Check all sites
-    results = await site_monitor.check_all_sites(proxy_manager)
+    # Check only the requested sites; fresh results (e.g. of the periodic check or another admin's
+    # /check) are reused and concurrent checks of the same site are shared, so targets aren't hammered
+    results = await site_monitor.check_all_sites(
+        proxy_manager, config.CHECK_CONCURRENCY, reload=False, names=names, max_age=config.CHECK_CACHE_TTL
+    )
     
     # Form report
     report = "📊 <b>Site check results:</b>\n\n"
@@ -254,15 +353,9 @@ async def cmd_check_sites(message: Message):
         report += f"   URL: {result['url']}\n"
         report += f"   Статус: {status_text}\n"
         
-        # Add expected content type
+        # Add expected content type or probe type
         site_info = site_monitor.get_sites().get(result['name'], {})
-        expected_content_type = site_info.get("expected_content_type", "text/html")
-        content_emoji = "🌐"
-        if expected_content_type == "application/json":
-            content_emoji = "📋"
-        elif expected_content_type.startswith("text/"):
-            content_emoji = "📄"
-        report += f"   {content_emoji} Ожидаемый тип: {expected_content_type}\n"
+        report += get_probe_info(result['url'], site_info.get("expected_content_type", "text/html"))
         
         # Add response time with speed emoji
         if result.get("response_time") is not None:
@@ -271,8 +364,17 @@ async def cmd_check_sites(message: Message):
         else:
             report += f"   ⏱️ Время отклика: ❓ N/A\n"
         
-        # Add proxy information
-        if result.get("proxy_used"):
+        # Add proxy or per-region information
+        if result.get("regions"):
+            report += f"   🌍 Регионы: {format_regions(result['regions'])}\n"
+            for region, region_result in result["regions"].items():
+                region_emoji = {True: "🟢", False: "🔴", None: "⚪"}[region_result["is_up"]]
+                if region_result.get("response_time") is not None:
+                    region_details = f"{region_result['response_time']} мс"
+                else:
+                    region_details = region_result.get("error") or "N/A"
+                report += f"      {region_emoji} {region.upper()}: {region_details}\n"
+        elif result.get("proxy_used"):
             report += f"   🌍 Прокси: {result['proxy_used']}\n"
         
         if result.get("status_code"):
@@ -288,23 +390,42 @@ async def cmd_check_sites(message: Message):
                 if not result.get("content_type_matches", True):
                     report += f"   ⚠️ Тип контента не совпадает с ожидаемым!\n"
         elif result.get("error"):
-            report += f"   Ошибка: {result['error']}\n"
+            report += f"   Ошибка ({result.get('error_type', 'other')}): {result['error']}\n"
+        
+        if result.get("attempts", 1) > 1:
+            report += f"   🔁 Попыток: {result['attempts']}\n"
+        
+        if result.get("cache_age") is not None:
+            report += f"   ♻️ Результат проверки {format_duration(result['cache_age'])} назад\n"
+        
+        if result.get("cert_days_left") is not None:
+            report += get_cert_info(result["cert_days_left"])
+        if result.get("addresses"):
+            report += f"   📍 Адреса: {', '.join(result['addresses'])}\n"
         
         report += "\n"
     
     # Delete the status message and send results
-    await bot.delete_message(chat_id=message.chat.id, message_id=status_msg.message_id)
-    await send_long_message(bot, message.chat.id, report)
+    await sender.delete_message(message.chat.id, status_msg.message_id)
+    await send_long_message(message.chat.id, report)
 
 @dp.message(Command("status"))
 async def cmd_status(message: Message):
-    """Command for showing current status of all sites"""
+    """Command for showing current status of all sites, one site or sites with a tag"""
     sites = site_monitor.get_sites()
     
     if not sites:
-        await message.answer("📝 Нет отслеживаемых сайтов.\n\nДобавьте сайты командой /add &lt;название&gt; &lt;url&gt;")
+        await sender.send_message(message.chat.id, "📝 Нет отслеживаемых сайтов.\n\nДобавьте сайты командой /add &lt;название&gt; &lt;url&gt;")
         return
     
+    # Parse command: /status [name|tag]
+    parts = message.text.split(maxsplit=1)
+    if len(parts) > 1:
+        names = await get_target_names(message, parts[1])
+        if not names:
+            return
+        sites = {name: sites[name] for name in names}
+    
     status_text = "📊 <b>Текущий статус сайтов:</b>\n\n"
     
     for name, info in sites.items():
@@ -312,14 +433,8 @@ async def cmd_status(message: Message):
         status_text += f"{status_emoji} <b>{name}</b>\n"
         status_text += f"   URL: {info['url']}\n"
         
-        # Add expected content type
-        expected_content_type = info.get("expected_content_type", "text/html")
-        content_emoji = "🌐"
-        if expected_content_type == "application/json":
-            content_emoji = "📋"
-        elif expected_content_type.startswith("text/"):
-            content_emoji = "📄"
-        status_text += f"   {content_emoji} Ожидаемый тип: {expected_content_type}\n"
+        # Add expected content type or probe type
+        status_text += get_probe_info(info['url'], info.get("expected_content_type", "text/html"))
         
         last_check = info.get("last_check")
         if last_check:
@@ -341,9 +456,183 @@ async def cmd_status(message: Message):
             speed_emoji, speed_desc = get_speed_info(last_response_time)
             status_text += f"   ⏱️ Последнее время отклика: {speed_emoji} {last_response_time} мс ({speed_desc})\n"
         
+        last_regions = info.get("last_regions")
+        if info.get("regions") and last_regions:
+            status_text += f"   🌍 Регионы: {format_regions(last_regions)}\n"
+        
+        if info.get("cert_days_left") is not None:
+            status_text += get_cert_info(info["cert_days_left"])
+        
         status_text += "\n"
     
-    await send_long_message(bot, message.chat.id, status_text)
+    await send_long_message(message.chat.id, status_text)
+
+@dp.message(Command("tag", "untag"))
+async def cmd_tag_sites(message: Message):
+    """Command for bulk adding or removing tags of sites"""
+    try:
+        # Parse command: /tag #tag [#tag ...] name [name ...]  or  /untag #tag [#tag ...] [name ...]
+        command, *args = message.text.replace(',', ' ').split()
+        untag = command.lstrip("/").split("@")[0].lower() == "untag"
+        tags = [arg for arg in args if arg.startswith("#")]
+        names = [arg.lower() for arg in args if not arg.startswith("#")]
+        if not tags or (not names and not untag):
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте:\n• /tag #тег [#тег] &lt;название&gt; [название ...] - добавить теги сайтам\n• /untag #тег [#тег] [название ...] - убрать теги (без названий - у всех сайтов)\n\nПример: /tag #payments billing checkout invoices")
+            return
+        
+        if untag:
+            if not names:
+                # Without names the tags are removed from every site that has them
+                names = sorted({name for tag in tags for name in site_monitor.get_names_by_tag(tag)})
+            missing = await site_monitor.tag_sites(names, remove=tags)
+        else:
+            missing = await site_monitor.tag_sites(names, add=tags)
+        
+        updated = len(names) - len(missing)
+        action = "убраны у" if untag else "добавлены"
+        response_text = f"✅ Теги {' '.join(tags)} {action} {updated} сайт(ов)"
+        if missing:
+            response_text += f"\n\n⚠️ Не найдены: {', '.join(missing)}"
+        await sender.send_message(message.chat.id, response_text)
+    
+    except Exception as e:
+        logger.error(f"Error tagging sites: {e}")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при изменении тегов")
+
+@dp.message(Command("tags"))
+async def cmd_tags(message: Message):
+    """Command for showing tags and their sites"""
+    tags = site_monitor.get_tags()
+    if not tags:
+        await sender.send_message(message.chat.id, "🏷 Тегов пока нет.\n\nДобавьте теги командой /tag #тег &lt;название&gt;")
+        return
+    
+    tags_text = "🏷 <b>Теги:</b>\n\n"
+    for tag, names in tags.items():
+        chat_info = " → чат уведомлений" if tag in config.TAG_CHATS else ""
+        tags_text += f"<b>#{tag}</b> ({len(names)}){chat_info}\n"
+        tags_text += f"   {', '.join(names)}\n\n"
+    
+    await send_long_message(message.chat.id, tags_text)
+
+@dp.message(Command("regions"))
+async def cmd_site_regions(message: Message):
+    """Command for setting countries a site is checked from"""
+    try:
+        # Parse command: /regions name [country ...]
+        parts = message.text.replace(',', ' ').split()
+        if len(parts) < 2:
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /regions &lt;название&gt; [страны]\n\nПримеры:\n• /regions google ru de us - проверять из трех стран\n• /regions google - проверять через любой прокси")
+            return
+        
+        name = parts[1].lower()
+        regions = [region.lower() for region in parts[2:]]
+        
+        if not await site_monitor.set_site_regions(name, regions):
+            await sender.send_message(message.chat.id, f"❌ Сайт с названием <b>{name}</b> не найден!")
+            return
+        
+        if not regions:
+            await sender.send_message(message.chat.id, f"✅ Сайт <b>{name}</b> будет проверяться через случайный прокси")
+            return
+        
+        response_text = f"✅ Сайт <b>{name}</b> будет проверяться из регионов: {', '.join(region.upper() for region in regions)}"
+        missing = [region.upper() for region in regions if not proxy_manager.get_proxies_by_country(region)]
+        if missing:
+            response_text += f"\n\n⚠️ Нет активных прокси для: {', '.join(missing)}"
+        await sender.send_message(message.chat.id, response_text)
+    
+    except Exception as e:
+        logger.error(f"Error setting site regions: {e}")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при настройке регионов")
+
+@dp.message(Command("uptime"))
+async def cmd_uptime(message: Message):
+    """Command for showing uptime/SLA report"""
+    # Parse command: /uptime [name] [period], arguments in any order
+    args = message.text.split()[1:]
+    period = next((arg for arg in args if arg.lower() in PERIODS), "24h").lower()
+    names = [arg.lower() for arg in args if arg.lower() not in PERIODS]
+    
+    sites = site_monitor.get_sites()
+    if names:
+        missing = [name for name in names if name not in sites]
+        if missing:
+            await sender.send_message(message.chat.id, f"❌ Сайт с названием <b>{missing[0]}</b> не найден!")
+            return
+    else:
+        names = list(sites)
+    
+    if not names:
+        await sender.send_message(message.chat.id, "📝 Нет отслеживаемых сайтов.\n\nДобавьте сайты командой /add &lt;название&gt; &lt;url&gt;")
+        return
+    
+    report = f"📈 <b>Доступность за {period}:</b>\n\n"
+    for name in names:
+        uptime = uptime_tracker.get_report(name, period)
+        if not uptime or not uptime["checks"]:
+            report += f"❓ <b>{name}</b>\n   Нет данных за период\n\n"
+            continue
+        
+        status_emoji = "🔴" if uptime["is_down"] else "🟢"
+        report += f"{status_emoji} <b>{name}</b>\n"
+        report += f"   📊 Uptime: {uptime['uptime']}% ({uptime['checks']} проверок)\n"
+        report += f"   🚨 Инцидентов: {uptime['incidents']}\n"
+        report += f"   ⏳ Время простоя: {format_duration(uptime['downtime'])}\n"
+        if uptime["mttr"] is not None:
+            report += f"   🔧 MTTR: {format_duration(uptime['mttr'])}\n"
+        report += "\n"
+    
+    await send_long_message(message.chat.id, report)
+
+@dp.message(Command("timeout"))
+async def cmd_site_timeout(message: Message):
+    """Command for setting per-site timeouts and retries"""
+    try:
+        # Parse command: /timeout name [total=sec] [connect=sec] [read=sec] [retries=n]
+        parts = message.text.split()
+        if len(parts) < 2:
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /timeout &lt;название&gt; [total=с] [connect=с] [read=с] [retries=n]\n\nПримеры:\n• /timeout api_ping total=30 connect=3 retries=2\n• /timeout google - показать текущие настройки")
+            return
+        
+        name = parts[1].lower()
+        if name not in site_monitor.get_sites():
+            await sender.send_message(message.chat.id, f"❌ Сайт с названием <b>{name}</b> не найден!")
+            return
+        
+        values = {}
+        for part in parts[2:]:
+            key, _, value = part.partition("=")
+            key = key.lower()
+            if key not in ("total", "connect", "read", "retries") or not value:
+                await sender.send_message(message.chat.id, f"❌ Неизвестный параметр: {part}")
+                return
+            if key == "retries":
+                values[key] = int(value)
+                if values[key] < 0:
+                    raise ValueError(part)
+            else:
+                values[key] = float(value)
+                # Zero or negative timeouts fail every check, inf and nan remove the deadline
+                if not (math.isfinite(values[key]) and values[key] > 0):
+                    raise ValueError(part)
+        
+        if values:
+            await site_monitor.set_check_settings(name, **values)
+        
+        settings = site_monitor.get_check_settings(name)
+        response_text = f"⏱️ <b>Настройки проверки {name}:</b>\n\n"
+        response_text += f"   Общий дедлайн: {settings['total']} с\n"
+        response_text += f"   Подключение: {settings['connect'] or '—'} с\n"
+        response_text += f"   Чтение: {settings['read'] or '—'} с\n"
+        response_text += f"   Повторов: {settings['retries']}\n"
+        await sender.send_message(message.chat.id, response_text)
+    
+    except ValueError:
+        await sender.send_message(message.chat.id, "❌ Таймауты должны быть положительными числами, а повторы - целым числом от 0, например total=30 retries=2")
+    except Exception as e:
+        logger.error(f"Error setting site timeouts: {e}")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при настройке таймаутов")
 
 # Commands for proxy management
 @dp.message(Command("proxy_add"))
@@ -353,7 +642,7 @@ async def cmd_add_proxy(message: Message):
         # Parse command: /proxy_add name url country
         parts = message.text.split(maxsplit=3)
         if len(parts) < 4:
-            await message.answer("❌ Неправильный формат команды!\n\nИспользуйте: /proxy_add &lt;название&gt; &lt;url&gt; &lt;страна&gt;\n\nПример: /proxy_add us_proxy http://proxy.example.com:8080 us")
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /proxy_add &lt;название&gt; &lt;url&gt; &lt;страна&gt;\n\nПример: /proxy_add us_proxy http://proxy.example.com:8080 us")
             return
         
         name = parts[1].lower()
@@ -366,13 +655,13 @@ async def cmd_add_proxy(message: Message):
         
         # Add proxy
         if await proxy_manager.add_proxy(name, proxy_url, country, message.from_user.id):
-            await message.answer(f"✅ Прокси <b>{name}</b> успешно добавлен!\n\nURL: {proxy_url}\n🌍 Страна: {country.upper()}")
+            await sender.send_message(message.chat.id, f"✅ Прокси <b>{name}</b> успешно добавлен!\n\nURL: {proxy_url}\n🌍 Страна: {country.upper()}")
         else:
-            await message.answer(f"❌ Прокси с названием <b>{name}</b> уже существует!")
+            await sender.send_message(message.chat.id, f"❌ Прокси с названием <b>{name}</b> уже существует!")
     
     except Exception as e:
         logger.error(f"Error adding proxy: {e}")
-        await message.answer("❌ Произошла ошибка при добавлении прокси")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при добавлении прокси")
 
 
 @dp.message(Command("proxy_remove"))
@@ -381,19 +670,19 @@ async def cmd_remove_proxy(message: Message):
     try:
         parts = message.text.split(maxsplit=1)
         if len(parts) < 2:
-            await message.answer("❌ Неправильный формат команды!\n\nИспользуйте: /proxy_remove &lt;название&gt;\n\nПример: /proxy_remove us_proxy")
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /proxy_remove &lt;название&gt;\n\nПример: /proxy_remove us_proxy")
             return
         
         name = parts[1].lower()
         
         if await proxy_manager.remove_proxy(name):
-            await message.answer(f"✅ Прокси <b>{name}</b> удален!")
+            await sender.send_message(message.chat.id, f"✅ Прокси <b>{name}</b> удален!")
         else:
-            await message.answer(f"❌ Прокси с названием <b>{name}</b> не найден!")
+            await sender.send_message(message.chat.id, f"❌ Прокси с названием <b>{name}</b> не найден!")
     
     except Exception as e:
         logger.error(f"Error removing proxy: {e}")
-        await message.answer("❌ Произошла ошибка при удалении прокси")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при удалении прокси")
 
 
 @dp.message(Command("proxy_list"))
@@ -402,7 +691,7 @@ async def cmd_list_proxies(message: Message):
     proxies = proxy_manager.get_proxies()
     
     if not proxies:
-        await message.answer("📝 Список прокси пуст.\n\nДобавьте первый прокси командой /proxy_add &lt;название&gt; &lt;url&gt; &lt;страна&gt;")
+        await sender.send_message(message.chat.id, "📝 Список прокси пуст.\n\nДобавьте первый прокси командой /proxy_add &lt;название&gt; &lt;url&gt; &lt;страна&gt;")
         return
     
     proxies_text = "📝 <b>Доступные прокси:</b>\n\n"
@@ -423,7 +712,7 @@ async def cmd_list_proxies(message: Message):
         
         proxies_text += "\n"
     
-    await send_long_message(bot, message.chat.id, proxies_text)
+    await send_long_message(message.chat.id, proxies_text)
 
 @dp.message(Command("proxy_test"))
 async def cmd_test_proxy(message: Message):
@@ -431,30 +720,30 @@ async def cmd_test_proxy(message: Message):
     try:
         parts = message.text.split(maxsplit=1)
         if len(parts) < 2:
-            await message.answer("❌ Неправильный формат команды!\n\nИспользуйте: /proxy_test &lt;название&gt;\n\nПример: /proxy_test us_proxy")
+            await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /proxy_test &lt;название&gt;\n\nПример: /proxy_test us_proxy")
             return
         
         name = parts[1].lower()
         proxy_info = proxy_manager.proxies.get(name)
         
         if not proxy_info:
-            await message.answer(f"❌ Прокси с названием <b>{name}</b> не найден!")
+            await sender.send_message(message.chat.id, f"❌ Прокси с названием <b>{name}</b> не найден!")
             return
         
         # Send message about start of testing
-        status_msg = await message.answer(f"🔍 Testing proxy <b>{name}</b>...")
+        status_msg = await sender.send_message(message.chat.id, f"🔍 Testing proxy <b>{name}</b>...")
         
         # Test proxy
         is_working = await proxy_manager.test_proxy(proxy_info["proxy_url"])
         
         if is_working:
-            await bot.edit_message_text(
+            await sender.edit_message_text(
                 chat_id=message.chat.id,
                 message_id=status_msg.message_id,
                 text=f"✅ Прокси <b>{name}</b> работает!\n\nURL: {proxy_info['proxy_url']}\n🌍 Страна: {proxy_info['country'].upper()}"
             )
         else:
-            await bot.edit_message_text(
+            await sender.edit_message_text(
                 chat_id=message.chat.id,
                 message_id=status_msg.message_id,
                 text=f"❌ Прокси <b>{name}</b> не работает!\n\nURL: {proxy_info['proxy_url']}\n🌍 Страна: {proxy_info['country'].upper()}"
@@ -462,7 +751,104 @@ async def cmd_test_proxy(message: Message):
     
     except Exception as e:
         logger.error(f"Error testing proxy: {e}")
-        await message.answer("❌ Произошла ошибка при тестировании прокси")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при тестировании прокси")
+
+async def send_diagnostics(chat_id: int, title: str, text: str, filename: str,
+                           attachment: bytes = None, attachment_name: str = None):
+    """Sends diagnostics report as preformatted text (or as a file if it's too long) with an optional attachment"""
+    if len(text) <= 3500:
+        await sender.send_message(chat_id, f"{title}\n\n<pre>{html.escape(text)}</pre>")
+    else:
+        await sender.request(SendDocument(
+            chat_id=chat_id, document=BufferedInputFile(text.encode(), filename=filename), caption=title
+        ))
+    if attachment:
+        await sender.request(SendDocument(
+            chat_id=chat_id, document=BufferedInputFile(attachment, filename=attachment_name)
+        ))
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: Message):
+    """Command for sampling CPU profile of the next check cycles or of the next seconds"""
+    # Parse command: /profile [cycles | seconds + "s"]
+    parts = message.text.split()
+    arg = parts[1].lower() if len(parts) > 1 else "1"
+    try:
+        if arg.endswith("s"):
+            seconds = min(float(arg[:-1]), MAX_PROFILE_SECONDS)
+            cycles = None
+        else:
+            cycles = int(arg)
+        if (cycles if cycles is not None else seconds) <= 0:
+            raise ValueError(arg)
+    except ValueError:
+        await sender.send_message(message.chat.id, "❌ Неправильный формат команды!\n\nИспользуйте: /profile [циклы | секунды + s]\n\nПримеры:\n• /profile - следующий цикл проверки\n• /profile 3 - следующие 3 цикла проверки\n• /profile 30s - весь процесс (включая команды) в течение 30 секунд")
+        return
+    
+    try:
+        if cycles is None:
+            await sender.send_message(message.chat.id, f"⏱ Профилирование {seconds:g} с...")
+            profiler = SamplingProfiler()
+            profiler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+            title = f"🔬 <b>Профиль за {seconds:g} с</b>"
+        else:
+            if cycle_profiler.running:
+                await sender.send_message(message.chat.id, "⏳ Профилирование циклов проверки уже запущено")
+                return
+            future = cycle_profiler.request(cycles)
+            await sender.send_message(message.chat.id, f"⏱ Профилирование следующих циклов проверки: {cycles}...")
+            try:
+                profiler = await asyncio.wait_for(future, PROFILE_CYCLES_TIMEOUT)
+            except asyncio.TimeoutError:
+                cycle_profiler.cancel()
+                await sender.send_message(message.chat.id, f"❌ Циклы проверки не завершились за {format_duration(PROFILE_CYCLES_TIMEOUT)}")
+                return
+            title = f"🔬 <b>Профиль циклов проверки: {cycles}</b>"
+        
+        await send_diagnostics(
+            message.chat.id, title, profiler.format_summary(), "profile.txt",
+            profiler.format_collapsed().encode(), "profile.folded"
+        )
+    
+    except Exception as e:
+        logger.error(f"Error profiling: {e}")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при профилировании")
+
+@dp.message(Command("memory"))
+async def cmd_memory(message: Message):
+    """Command for tracemalloc snapshots and diffs"""
+    # Parse command: /memory [start|stop]
+    parts = message.text.split()
+    action = parts[1].lower() if len(parts) > 1 else ""
+    
+    try:
+        if action == "stop":
+            if not memory_tracker.tracing:
+                await sender.send_message(message.chat.id, "📝 Отслеживание памяти не запущено")
+                return
+            memory_tracker.stop()
+            await sender.send_message(message.chat.id, "✅ Отслеживание памяти остановлено")
+        elif action == "start" or not memory_tracker.tracing:
+            memory_tracker.start()
+            await sender.send_message(message.chat.id, "📸 Отслеживание памяти запущено, базовый снимок сделан.\n\nПовторите /memory, чтобы увидеть крупнейшие выделения и рост памяти, /memory stop - остановить")
+        else:
+            await send_diagnostics(message.chat.id, "🧠 <b>Память</b>", memory_tracker.format_report(), "memory.txt")
+    
+    except Exception as e:
+        logger.error(f"Error taking memory snapshot: {e}")
+        await sender.send_message(message.chat.id, "❌ Произошла ошибка при снимке памяти")
+
+@dp.message(Command("tasks"))
+async def cmd_tasks(message: Message):
+    """Command for showing asyncio tasks, event loop lag and Telegram queue"""
+    report = format_runtime_stats(loop_lag_monitor)
+    report += (f"\n\nTelegram queue: {sender.pending_count()} pending, sent {sender.stats['sent']}, "
+               f"retry after {sender.stats['retry_after']}, failed {sender.stats['failed']}")
+    await send_diagnostics(message.chat.id, "⚙️ <b>Состояние процесса</b>", report, "tasks.txt")
 
 
 async def main():
@@ -472,13 +858,46 @@ async def main():
     # Initialize monitors
     await site_monitor.initialize()
     await proxy_manager.initialize()
+    await uptime_tracker.initialize()
+    loop_lag_monitor.start()
+    
+    # Restore runtime state of the checker saved on the previous shutdown
+    await checker_state.load()
+    proxy_manager.health.update(checker_state.proxy_health)
+    if checker_state.pending_alerts:
+        logger.info(f"Resending {len(checker_state.pending_alerts)} undelivered alerts")
+        sender.resubmit(checker_state.pending_alerts)
+        checker_state.pending_alerts = []
     
     # Start periodic checking in background
-    asyncio.create_task(periodic_check(site_monitor, proxy_manager))
+    checker_task = asyncio.create_task(periodic_check(
+        site_monitor, proxy_manager, checker_state, uptime_tracker,
+        agent_aggregator if config.AGENT_TOKEN else None
+    ))
+    
+    # Web app serves webhook updates and/or the remote agents API
+    app = create_app(dp, bot)
+    if config.AGENT_TOKEN:
+        setup_agent_routes(app, agent_aggregator, site_monitor, config.AGENT_TOKEN)
     
     # Start bot
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        if config.WEBHOOK_URL:
+            await run_webhook(dp, bot, app)
+        else:
+            runner = await start_web_app(app) if config.AGENT_TOKEN else None
+            try:
+                await bot.delete_webhook(drop_pending_updates=True)
+                await dp.start_polling(bot)
+            finally:
+                if runner:
+                    await runner.cleanup()
+    finally:
+        checker_task.cancel()
+        await sender.close()
+        # Unsaved check results are written, alerts still queued after close() are sent after restart
+        await flush_state(site_monitor, proxy_manager, uptime_tracker, checker_state)
+        await bot.session.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
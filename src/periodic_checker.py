@@ -1,17 +1,54 @@
 import asyncio
+import time
 from datetime import datetime
 from src.logger import logger
 from src.site_monitor import SiteMonitor
 from src.proxy_manager import ProxyManager
+from src.uptime import UptimeTracker
+from src.agents import AgentAggregator
+from src.checker_state import CheckerState
+from src.diagnostics import CycleProfiler
 from src import config
-from aiogram import Bot
+from src.telegram_client import sender, PRIORITY_ALERT
 
-# Bot initialization for sending notifications
-bot = Bot(token=config.BOT_TOKEN)
+# Seconds between scheduler wake-ups looking for due sites
+SCHEDULER_TICK = 5
 
-async def send_down_notification(site_name: str, url: str, error: str = None, proxy_used: str = None, status_code: int = None, content_type: str = None, expected_content_type: str = None, content_type_matches: bool = None):
-    """Sends notification about site unavailability to REPORT_CHAT"""
-    if not config.REPORT_CHAT_ID:
+# Seconds between writes of scheduled check results and checker state snapshots (also done on shutdown)
+STATE_SAVE_INTERVAL = 60
+
+# Profiles the next check cycles on an admin request (/profile)
+cycle_profiler = CycleProfiler()
+
+def format_regions(regions: dict) -> str:
+    """Returns short summary of a region matrix (which countries see the site down/up, which have no proxy)"""
+    down = [region.upper() for region, result in regions.items() if result["is_up"] is False]
+    up = [region.upper() for region, result in regions.items() if result["is_up"]]
+    unknown = [region.upper() for region, result in regions.items() if result["is_up"] is None]
+    parts = []
+    if down:
+        parts.append(f"🔴 недоступен из {', '.join(down)}")
+    if up:
+        parts.append(f"🟢 доступен из {', '.join(up)}")
+    if unknown:
+        parts.append(f"⚪ неизвестно из {', '.join(unknown)} (нет прокси)")
+    return "; ".join(parts)
+
+def format_vantage_points(vantage_points: dict) -> str:
+    """Returns list of vantage points (local bot and agents) with their verdicts"""
+    return ", ".join(f"{'🟢' if is_up else '🔴'} {name}" for name, is_up in vantage_points.items())
+
+def get_notification_chats(tags: list = None) -> list:
+    """Returns chats for notifications about a site: chats of its tags from TAG_CHATS, else REPORT_CHAT"""
+    chat_ids = list(dict.fromkeys(config.TAG_CHATS[tag] for tag in tags or [] if tag in config.TAG_CHATS))
+    if not chat_ids and config.REPORT_CHAT_ID:
+        chat_ids = [config.REPORT_CHAT_ID]
+    return chat_ids
+
+async def send_down_notification(site_name: str, url: str, error: str = None, error_type: str = None, proxy_used: str = None, status_code: int = None, content_type: str = None, expected_content_type: str = None, content_type_matches: bool = None, regions: dict = None, vantage_points: dict = None, chat_ids: list = None):
+    """Sends notification about site unavailability to REPORT_CHAT (or chats of the site tags)"""
+    chat_ids = chat_ids or get_notification_chats()
+    if not chat_ids:
         logger.warning("REPORT_CHAT_ID not configured, notifications not sent")
         return
     
@@ -26,9 +63,14 @@ async def send_down_notification(site_name: str, url: str, error: str = None, pr
         if status_code:
             notification += f"📊 <b>Код ответа:</b> {status_code}\n"
         
-        if proxy_used:
+        if regions:
+            notification += f"🌍 <b>Регионы:</b> {format_regions(regions)}\n"
+        elif proxy_used:
             notification += f"🌍 <b>Прокси:</b> {proxy_used}\n"
         
+        if vantage_points:
+            notification += f"👁 <b>Точки проверки:</b> {format_vantage_points(vantage_points)}\n"
+        
         if content_type and expected_content_type:
             content_type_status = "✅" if content_type_matches else "❌"
             notification += f"📄 <b>Тип контента:</b> {content_type_status}\n"
@@ -36,21 +78,21 @@ async def send_down_notification(site_name: str, url: str, error: str = None, pr
             notification += f"   • Ожидаемый: {expected_content_type}\n"
         
         if error:
-            notification += f"❌ <b>Ошибка:</b> {error}\n"
+            error_label = f" ({error_type})" if error_type else ""
+            notification += f"❌ <b>Ошибка{error_label}:</b> {error}\n"
         
-        await bot.send_message(
-            chat_id=config.REPORT_CHAT_ID,
-            text=notification,
-            parse_mode="HTML"
-        )
-        logger.info(f"Notification about {site_name} unavailability sent to REPORT_CHAT")
+        # Queued, not awaited: delivery is paced by the limiter and must not hold up the checker
+        for chat_id in chat_ids:
+            sender.queue_message(chat_id, notification, PRIORITY_ALERT, parse_mode="HTML")
+        logger.info(f"Notification about {site_name} unavailability queued for {', '.join(chat_ids)}")
         
     except Exception as e:
         logger.error(f"Error sending notification to REPORT_CHAT: {e}")
 
-async def send_up_notification(site_name: str, url: str, proxy_used: str = None, status_code: int = None, content_type: str = None, expected_content_type: str = None, content_type_matches: bool = None):
-    """Sends notification about site recovery to REPORT_CHAT"""
-    if not config.REPORT_CHAT_ID:
+async def send_up_notification(site_name: str, url: str, proxy_used: str = None, status_code: int = None, content_type: str = None, expected_content_type: str = None, content_type_matches: bool = None, regions: dict = None, vantage_points: dict = None, chat_ids: list = None):
+    """Sends notification about site recovery to REPORT_CHAT (or chats of the site tags)"""
+    chat_ids = chat_ids or get_notification_chats()
+    if not chat_ids:
         logger.warning("REPORT_CHAT_ID not configured, notifications not sent")
         return
     
@@ -65,76 +107,190 @@ async def send_up_notification(site_name: str, url: str, proxy_used: str = None,
         if status_code:
             notification += f"📊 <b>Код ответа:</b> {status_code}\n"
         
-        if proxy_used:
+        if regions:
+            notification += f"🌍 <b>Регионы:</b> {format_regions(regions)}\n"
+        elif proxy_used:
             notification += f"🌍 <b>Прокси:</b> {proxy_used}\n"
         
+        if vantage_points:
+            notification += f"👁 <b>Точки проверки:</b> {format_vantage_points(vantage_points)}\n"
+        
         if content_type and expected_content_type:
             content_type_status = "✅" if content_type_matches else "❌"
             notification += f"📄 <b>Тип контента:</b> {content_type_status}\n"
             notification += f"   • Фактический: {content_type}\n"
             notification += f"   • Ожидаемый: {expected_content_type}\n"
         
-        await bot.send_message(
-            chat_id=config.REPORT_CHAT_ID,
-            text=notification,
-            parse_mode="HTML"
-        )
-        logger.info(f"Notification about {site_name} recovery sent to REPORT_CHAT")
+        # Queued, not awaited: delivery is paced by the limiter and must not hold up the checker
+        for chat_id in chat_ids:
+            sender.queue_message(chat_id, notification, PRIORITY_ALERT, parse_mode="HTML")
+        logger.info(f"Notification about {site_name} recovery queued for {', '.join(chat_ids)}")
         
     except Exception as e:
         logger.error(f"Error sending notification to REPORT_CHAT: {e}")
 
-async def periodic_check(site_monitor: SiteMonitor, proxy_manager: ProxyManager):
-    """Periodic site checking every 5 minutes"""
-    while True:
-        try:
-            # Reload sites from file on each iteration
-            await site_monitor.load_sites()
-            await proxy_manager.load_proxies()
+async def send_cert_expiry_notification(site_name: str, url: str, days_left: int, expires_at: str, chat_ids: list = None):
+    """Sends advance notification about TLS certificate expiry to REPORT_CHAT (or chats of the site tags)"""
+    chat_ids = chat_ids or get_notification_chats()
+    if not chat_ids:
+        logger.warning("REPORT_CHAT_ID not configured, notifications not sent")
+        return
+    
+    try:
+        expires_at_text = datetime.fromisoformat(expires_at).strftime("%d.%m.%Y %H:%M")
+        
+        notification = "⚠️ <b>СЕРТИФИКАТ СКОРО ИСТЕКАЕТ!</b>\n\n"
+        notification += f"📱 <b>Сайт:</b> {site_name}\n"
+        notification += f"🔗 <b>URL:</b> {url}\n"
+        notification += f"🔒 <b>Осталось дней:</b> {days_left}\n"
+        notification += f"⏰ <b>Истекает:</b> {expires_at_text} UTC\n"
+        
+        # Queued, not awaited: delivery is paced by the limiter and must not hold up the checker
+        for chat_id in chat_ids:
+            sender.queue_message(chat_id, notification, PRIORITY_ALERT, parse_mode="HTML")
+        logger.info(f"Notification about {site_name} certificate expiry queued for {', '.join(chat_ids)}")
+        
+    except Exception as e:
+        logger.error(f"Error sending notification to REPORT_CHAT: {e}")
+
+async def check_cycle(site_monitor: SiteMonitor, proxy_manager: ProxyManager, checker_state: CheckerState,
+                      interval: float, uptime_tracker: UptimeTracker = None, agent_aggregator: AgentAggregator = None):
+    """One periodic check of the sites due by the checker state schedule, with notifications.
+    
+    Returns number of checked sites.
+    """
+    # Pick up sites and proxies edited outside the bot
+    await site_monitor.reload_if_changed()
+    await proxy_manager.reload_if_changed()
+
+    sites = site_monitor.get_sites()
 
-            sites = site_monitor.get_sites()
+    if not sites:
+        return 0
+    
+    due = checker_state.take_due(sites, time.time(), interval, config.ALERT_AFTER_FAILURES)
+    if not due:
+        return 0
+    # Sites are updated in place when not reloaded, keep a copy of the previous state
+    previous = {name: dict(sites[name]) for name in due}
+    logger.info(f"Performing periodic checking of {len(due)} due sites...")
+    # Sites, proxies and uptime are written by flush_state() every STATE_SAVE_INTERVAL, not on every tick
+    results = await site_monitor.check_all_sites(proxy_manager, config.CHECK_CONCURRENCY, save=False,
+                                                 reload=False, names=due)
+    
+    # Combine with results of remote agents before deciding on alerts
+    if agent_aggregator:
+        agent_aggregator.merge_results(results, site_monitor.get_sites(), previous)
+    
+    # Log results and send notifications
+    for result in results:
+        site_name = result['name']
+        current_status = result["is_up"]
+        
+        status = "🟢 Available" if current_status else "🔴 Unavailable"
+        logger.info(f"{site_name}: {status}")
+        
+        if uptime_tracker:
+            uptime_tracker.record(site_name, current_status)
+        
+        # Alert after ALERT_AFTER_FAILURES failures in a row, recover only if the down alert was sent
+        previous_failures = checker_state.failures.get(site_name, 0)
+        failures = 0 if current_status else previous_failures + 1
+        checker_state.failures[site_name] = failures
+        went_down = failures == config.ALERT_AFTER_FAILURES
+        recovered = current_status and previous_failures >= config.ALERT_AFTER_FAILURES
+        
+        chat_ids = get_notification_chats(site_monitor.get_sites().get(site_name, {}).get("tags"))
+        
+        # Send notifications on status change
+        if went_down:
+            # Site became unavailable
+            await send_down_notification(
+                site_name=site_name,
+                url=result['url'],
+                error=result.get('error'),
+                error_type=result.get('error_type'),
+                proxy_used=result.get('proxy_used'),
+                status_code=result.get('status_code'),
+                content_type=result.get('content_type'),
+                expected_content_type=result.get('expected_content_type'),
+                content_type_matches=result.get('content_type_matches'),
+                regions=result.get('regions'),
+                vantage_points=result.get('vantage_points'),
+                chat_ids=chat_ids
+            )
+        elif recovered:
+            # Site recovered
+            await send_up_notification(
+                site_name=site_name,
+                url=result['url'],
+                proxy_used=result.get('proxy_used'),
+                status_code=result.get('status_code'),
+                content_type=result.get('content_type'),
+                expected_content_type=result.get('expected_content_type'),
+                content_type_matches=result.get('content_type_matches'),
+                regions=result.get('regions'),
+                vantage_points=result.get('vantage_points'),
+                chat_ids=chat_ids
+            )
+    
+        # Warn once per certificate when it gets close to expiry
+        days_left = result.get("cert_days_left")
+        if days_left is not None and days_left <= config.CERT_EXPIRY_WARN_DAYS:
+            site_info = site_monitor.get_sites().get(site_name)
+            if site_info and site_info.get("cert_alert_sent_for") != result["cert_expires_at"]:
+                await send_cert_expiry_notification(
+                    site_name, result['url'], days_left, result["cert_expires_at"], chat_ids
+                )
+                site_info["cert_alert_sent_for"] = result["cert_expires_at"]
+    
+    return len(results)
 
-            if sites:
-                logger.info("Performing periodic site checking...")
-                results = await site_monitor.check_all_sites(proxy_manager)
-                
-                # Log results and send notifications
-                for result in results:
-                    site_name = result['name']
-                    current_status = result["is_up"]
-                    previous_status = sites[site_name].get("is_up", True)
-                    
-                    status = "🟢 Available" if current_status else "🔴 Unavailable"
-                    logger.info(f"{site_name}: {status}")
-                    
-                    # Send notifications on status change
-                    if not current_status and previous_status:
-                        # Site became unavailable
-                        await send_down_notification(
-                            site_name=site_name,
-                            url=result['url'],
-                            error=result.get('error'),
-                            proxy_used=result.get('proxy_used'),
-                            status_code=result.get('status_code'),
-                            content_type=result.get('content_type'),
-                            expected_content_type=result.get('expected_content_type'),
-                            content_type_matches=result.get('content_type_matches')
-                        )
-                    elif current_status and not previous_status:
-                        # Site recovered
-                        await send_up_notification(
-                            site_name=site_name,
-                            url=result['url'],
-                            proxy_used=result.get('proxy_used'),
-                            status_code=result.get('status_code'),
-                            content_type=result.get('content_type'),
-                            expected_content_type=result.get('expected_content_type'),
-                            content_type_matches=result.get('content_type_matches')
-                        )
-                
-        except Exception as e:
-            logger.error(f"Error during periodic checking: {e}")
-        
-        # Wait 5 minutes in production, 10 seconds in development
-        sleep_time = 10 if config.MODE == "dev" else 300
-        await asyncio.sleep(sleep_time) 
\ No newline at end of file
+async def run_cycle(*args) -> int:
+    """Runs check_cycle, logging errors and profiling it if requested; returns number of checked sites"""
+    cycle_profiler.cycle_started()
+    checked = 0
+    failed = False
+    try:
+        checked = await check_cycle(*args)
+    except Exception as e:
+        logger.error(f"Error during periodic checking: {e}")
+        failed = True
+    # Failed cycles are counted too, otherwise a broken checker would never finish a profile
+    cycle_profiler.cycle_finished(counted=checked > 0 or failed)
+    return checked
+
+async def flush_state(site_monitor: SiteMonitor, proxy_manager: ProxyManager, uptime_tracker: UptimeTracker,
+                      checker_state: CheckerState):
+    """Writes results of the scheduled checks (sites, proxies, uptime) and the checker state snapshot"""
+    try:
+        await site_monitor.save_sites()
+        await proxy_manager.save_proxies()
+        if uptime_tracker:
+            await uptime_tracker.save()
+    except Exception as e:
+        logger.error(f"Error saving check results: {e}")
+    checker_state.pending_alerts = sender.pending_messages(PRIORITY_ALERT)
+    checker_state.proxy_health = dict(proxy_manager.health)
+    try:
+        await checker_state.save()
+    except Exception as e:
+        logger.error(f"Error saving checker state: {e}")
+
+async def periodic_check(site_monitor: SiteMonitor, proxy_manager: ProxyManager, checker_state: CheckerState,
+                         uptime_tracker: UptimeTracker = None, agent_aggregator: AgentAggregator = None):
+    """Periodic site checking every 5 minutes"""
+    # Check every 5 minutes in production, every 10 seconds in development
+    interval = 10 if config.MODE == "dev" else 300
+    
+    # Every site has its own schedule, wake up often and check the due ones
+    tick = min(SCHEDULER_TICK, interval / 2)
+    last_saved_at = time.time()
+    while True:
+        await run_cycle(site_monitor, proxy_manager, checker_state, interval, uptime_tracker, agent_aggregator)
+        
+        if time.time() - last_saved_at >= STATE_SAVE_INTERVAL:
+            await flush_state(site_monitor, proxy_manager, uptime_tracker, checker_state)
+            last_saved_at = time.time()
+        
+        await asyncio.sleep(min(tick, max(checker_state.seconds_until_next_due(time.time()), 0.5)))
@@ -0,0 +1,206 @@
+import asyncio
+import functools
+import socket
+import ssl
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.logger import logger
+
+# Probe types selected by the URL scheme of a site
+PROBE_HTTP = "http"
+PROBE_TCP = "tcp"
+PROBE_TLS = "tls"
+PROBE_DNS = "dns"
+
+PROBE_SCHEMES = {
+    "http": PROBE_HTTP,
+    "https": PROBE_HTTP,
+    "tcp": PROBE_TCP,
+    "tls": PROBE_TLS,
+    "dns": PROBE_DNS,
+}
+
+DEFAULT_TLS_PORT = 443
+
+TCP_PORT_REQUIRED = "port is required, e.g. tcp://db.example.com:5432"
+
+# Error classes reported in `error_type` of a check result
+ERROR_DNS = "dns"
+ERROR_CONNECT = "connect"
+ERROR_TLS = "tls"
+ERROR_PROXY = "proxy"
+ERROR_TIMEOUT = "timeout"
+ERROR_HTTP = "http"
+ERROR_OTHER = "other"
+
+
+def classify_error(error: BaseException) -> str:
+    """Returns error class (dns, connect, tls, proxy, timeout, http or other) of a probe exception"""
+    # Proxy errors first: they subclass the generic connection/response errors
+    if isinstance(error, (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError)):
+        return ERROR_PROXY
+    if isinstance(error, (aiohttp.ClientConnectorCertificateError, aiohttp.ClientSSLError, ssl.SSLError)):
+        return ERROR_TLS
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return ERROR_DNS if isinstance(error.os_error, socket.gaierror) else ERROR_CONNECT
+    if isinstance(error, socket.gaierror):
+        return ERROR_DNS
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return ERROR_TIMEOUT
+    if isinstance(error, (ConnectionError, aiohttp.ClientOSError, aiohttp.ServerDisconnectedError)):
+        return ERROR_CONNECT
+    if isinstance(error, aiohttp.ClientResponseError):
+        return ERROR_HTTP
+    return ERROR_OTHER
+
+
+def is_retryable(result: Dict) -> bool:
+    """Returns True if a failed probe may succeed on retry (transient error or HTTP 5xx)"""
+    error_type = result.get("error_type")
+    if error_type in (ERROR_CONNECT, ERROR_TIMEOUT, ERROR_PROXY):
+        return True
+    return error_type == ERROR_HTTP and (result.get("status_code") or 0) >= 500
+
+
+def _error_result(result: Dict, url: str, error: BaseException) -> Dict:
+    logger.error(f"Error checking {url}: {error}")
+    result["error"] = str(error) or type(error).__name__
+    result["error_type"] = classify_error(error)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context(verify: bool = True) -> ssl.SSLContext:
+    """Returns shared SSL context (creating one loads the CA bundle and blocks the loop)"""
+    ssl_context = ssl.create_default_context()
+    if not verify:
+        # Accepts self-signed certificates but doesn't disable SSL completely
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+
+def get_probe_type(url: str) -> str:
+    """Returns probe type for a site URL (http, tcp, tls or dns)"""
+    return PROBE_SCHEMES.get(urlsplit(url).scheme.lower(), PROBE_HTTP)
+
+
+def parse_address(url: str, default_port: Optional[int] = None) -> Tuple[str, Optional[int]]:
+    """Returns (host, port) from tcp://host:port, tls://host[:port] or dns://host.
+
+    Raises ValueError if the host is missing or the port is not a number in 0-65535.
+    """
+    parts = urlsplit(url)
+    if not parts.hostname:
+        raise ValueError(f"host is required, e.g. {parts.scheme}://example.com")
+    return parts.hostname, parts.port or default_port
+
+
+def validate_address(url: str):
+    """Raises ValueError if a tcp/tls/dns URL can't be probed (HTTP URLs are not checked)"""
+    probe = get_probe_type(url)
+    if probe == PROBE_HTTP:
+        return
+    _, port = parse_address(url, DEFAULT_TLS_PORT if probe == PROBE_TLS else None)
+    if probe == PROBE_TCP and not port:
+        raise ValueError(TCP_PORT_REQUIRED)
+
+
+def _base_result(probe: str) -> Dict:
+    return {
+        "probe": probe,
+        "status_code": None,
+        "is_up": False,
+        "checked_at": datetime.now().isoformat(),
+        "response_time": None,
+        "proxy_used": None,
+    }
+
+
+async def probe_tcp(url: str, timeout: float) -> Dict:
+    """Checks that a TCP connection to host:port can be established"""
+    result = _base_result(PROBE_TCP)
+    try:
+        host, port = parse_address(url)
+        if not port:
+            raise ValueError(TCP_PORT_REQUIRED)
+        start_time = time.time()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        result["response_time"] = round((time.time() - start_time) * 1000, 2)
+        writer.close()
+        await writer.wait_closed()
+        result["is_up"] = True
+    except Exception as e:
+        _error_result(result, url, e)
+    return result
+
+
+async def probe_tls(url: str, timeout: float) -> Dict:
+    """Performs a verified TLS handshake and records the certificate expiry, subject, issuer and chain"""
+    result = _base_result(PROBE_TLS)
+    writer = None
+    try:
+        host, port = parse_address(url, DEFAULT_TLS_PORT)
+        start_time = time.time()
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=get_ssl_context(), server_hostname=host),
+            timeout
+        )
+        result["response_time"] = round((time.time() - start_time) * 1000, 2)
+
+        ssl_object = writer.get_extra_info("ssl_object")
+        cert = ssl_object.getpeercert()
+        expires_at = datetime.fromtimestamp(ssl.cert_time_to_seconds(cert["notAfter"]), tz=timezone.utc)
+        result["cert_expires_at"] = expires_at.isoformat()
+        result["cert_days_left"] = (expires_at - datetime.now(timezone.utc)).days
+        result["cert_subject"] = dict(item[0] for item in cert.get("subject", ())).get("commonName")
+        result["cert_issuer"] = dict(item[0] for item in cert.get("issuer", ())).get("organizationName")
+        result["tls_version"] = ssl_object.version()
+
+        # The verified chain is public API since Python 3.13; 3.10-3.12 expose the same method
+        # on the underlying _ssl object. Left out if neither is available
+        get_verified_chain = (getattr(ssl_object, "get_verified_chain", None)
+                              or getattr(getattr(ssl_object, "_sslobj", None), "get_verified_chain", None))
+        chain = get_verified_chain() if get_verified_chain else None
+        if chain:
+            result["cert_chain"] = [
+                dict(item[0] for item in chain_cert.get_info().get("subject", ())).get("commonName")
+                for chain_cert in chain
+            ]
+        result["is_up"] = True
+    except Exception as e:
+        _error_result(result, url, e)
+    finally:
+        if writer is not None:
+            # No graceful close: a peer that never answers close_notify would hold the probe
+            # for asyncio's 30 s SSL shutdown timeout
+            writer.transport.abort()
+    return result
+
+
+async def probe_dns(url: str, timeout: float) -> Dict:
+    """Checks that a host name resolves"""
+    result = _base_result(PROBE_DNS)
+    try:
+        host, _ = parse_address(url)
+        loop = asyncio.get_running_loop()
+        start_time = time.time()
+        addresses = await asyncio.wait_for(loop.getaddrinfo(host, None, proto=socket.IPPROTO_TCP), timeout)
+        result["response_time"] = round((time.time() - start_time) * 1000, 2)
+        result["addresses"] = sorted({address[4][0] for address in addresses})
+        result["is_up"] = bool(result["addresses"])
+    except Exception as e:
+        _error_result(result, url, e)
+    return result
+
+
+PROBES = {
+    PROBE_TCP: probe_tcp,
+    PROBE_TLS: probe_tls,
+    PROBE_DNS: probe_dns,
+}
@@ -1,5 +1,7 @@
 
+import asyncio
 import json
+import os
 import aiohttp
 import aiofiles
 import ssl
@@ -10,29 +12,55 @@ from src.logger import logger
 # File for storing proxies
 PROXIES_FILE = "./data/proxies.json"
 
+# Proxies with this many failures in a row are used only if there is no healthy one
+MAX_CONSECUTIVE_FAILURES = 3
+
 class ProxyManager:
-    def __init__(self):
+    def __init__(self, proxies_file: str = PROXIES_FILE):
+        self.proxies_file = proxies_file
         self.proxies: Dict[str, Dict] = {}
+        # Runtime health: proxy name -> failures in a row
+        self.health: Dict[str, int] = {}
+        self._save_lock = asyncio.Lock()
+        # mtime of the file when it was last loaded or saved by us, None if unknown
+        self._file_mtime: Optional[int] = None
         # Initialization will be async
     
     async def initialize(self):
         """Async initialization"""
         await self.load_proxies()
     
-    async def load_proxies(self):
-        """Async loads proxies from JSON file"""
+    async def load_proxies(self, create: bool = True):
+        """Async loads proxies from JSON file, a missing file is created empty unless `create` is False"""
         try:
-            async with aiofiles.open(PROXIES_FILE, 'r', encoding='utf-8') as f:
+            async with aiofiles.open(self.proxies_file, 'r', encoding='utf-8') as f:
                 content = await f.read()
                 self.proxies = json.loads(content)
         except FileNotFoundError:
             self.proxies = {}
-            await self.save_proxies()
+            if create:
+                await self.save_proxies()
+        self._file_mtime = self._get_file_mtime()
+    
+    def _get_file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.proxies_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    async def reload_if_changed(self) -> bool:
+        """Reloads proxies only if the file was changed by someone else since we last loaded or saved it"""
+        if self._file_mtime is not None and self._get_file_mtime() == self._file_mtime:
+            return False
+        await self.load_proxies()
+        return True
     
     async def save_proxies(self):
         """Async saves proxies to JSON file"""
-        async with aiofiles.open(PROXIES_FILE, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(self.proxies, ensure_ascii=False, indent=2))
+        async with self._save_lock:
+            async with aiofiles.open(self.proxies_file, 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(self.proxies, ensure_ascii=False, indent=2))
+            self._file_mtime = self._get_file_mtime()
     
     async def add_proxy(self, name: str, proxy_url: str, country: str, user_id: int) -> bool:
         """Async adds new proxy"""
@@ -80,15 +108,18 @@ class ProxyManager:
             if proxy_info["is_active"]
         ]
     
-    async def update_proxy_stats(self, name: str, success: bool):
+    async def update_proxy_stats(self, name: str, success: bool, save: bool = True):
         """Async updates proxy statistics"""
         if name in self.proxies:
             self.proxies[name]["last_used"] = datetime.now().isoformat()
             if success:
                 self.proxies[name]["success_count"] += 1
+                self.health[name] = 0
             else:
                 self.proxies[name]["fail_count"] += 1
-            await self.save_proxies()
+                self.health[name] = self.health.get(name, 0) + 1
+            if save:
+                await self.save_proxies()
     
     async def test_proxy(self, proxy_url: str) -> bool:
         """Tests proxy asynchronously"""
@@ -119,10 +150,19 @@ class ProxyManager:
             return self.proxies[name]["proxy_url"]
         return None
     
+    def get_proxy_name(self, proxy_url: str) -> Optional[str]:
+        """Returns proxy name by URL"""
+        return next((name for name, info in self.proxies.items() if info["proxy_url"] == proxy_url), None)
+    
+    def _prefer_healthy(self, proxies: List[Dict]) -> List[Dict]:
+        """Filters out proxies failing in a row, unless none is left"""
+        healthy = [proxy for proxy in proxies if self.health.get(proxy["name"], 0) < MAX_CONSECUTIVE_FAILURES]
+        return healthy or proxies
+    
     def get_random_proxy(self) -> Optional[Dict]:
         """Returns random active proxy"""
         import random
-        active_proxies = self.get_active_proxies()
+        active_proxies = self._prefer_healthy(self.get_active_proxies())
         if active_proxies:
             return random.choice(active_proxies)
         return None
@@ -130,7 +170,7 @@ class ProxyManager:
     def get_proxy_by_country(self, country: str) -> Optional[Dict]:
         """Returns random proxy from specified country"""
         import random
-        country_proxies = self.get_proxies_by_country(country)
+        country_proxies = self._prefer_healthy(self.get_proxies_by_country(country))
         if country_proxies:
             return random.choice(country_proxies)
         return None 
\ No newline at end of file
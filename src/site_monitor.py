@@ -1,45 +1,120 @@
 
+import asyncio
 import json
+import os
+import random
 import aiofiles
 import time
-import ssl
 from datetime import datetime
-from typing import Dict, List
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import aiohttp
 from src.logger import logger
 from src.proxy_manager import ProxyManager
+from src.probes import (
+    PROBES, PROBE_HTTP, ERROR_HTTP, ERROR_PROXY,
+    classify_error, get_probe_type, get_ssl_context, is_retryable
+)
 
 # File for storing sites
 SITES_FILE = "./data/sites.json"
 
+# Default number of sites checked at the same time
+DEFAULT_CONCURRENCY = 10
+
+# Default deadline of one site check in seconds (all retries included)
+PROBE_TIMEOUT = 10
+
+# Default number of retries after a transient failure
+DEFAULT_RETRIES = 0
+
+# Base of the exponential retry backoff and the smallest budget worth an attempt, in seconds
+RETRY_BACKOFF = 0.5
+MIN_ATTEMPT_TIME = 0.5
+
+def normalize_tag(tag: str) -> str:
+    """Returns tag in stored form: lowercase, without leading #"""
+    return tag.strip().lstrip("#").lower()
+
+def normalize_tags(tags: Iterable[str]) -> List[str]:
+    """Normalizes tags, dropping empty ones and duplicates"""
+    return list(dict.fromkeys(tag for tag in map(normalize_tag, tags) if tag))
+
 class SiteMonitor:
-    def __init__(self):
+    def __init__(self, sites_file: str = SITES_FILE):
+        self.sites_file = sites_file
         self.sites: Dict[str, Dict] = {}
+        # Inverted index: tag -> names of sites with this tag
+        self.tag_index: Dict[str, Set[str]] = {}
+        # Latest result of every site: name -> (time.monotonic() of the check, result)
+        self.result_cache: Dict[str, Tuple[float, Dict]] = {}
+        # Checks running right now, shared by concurrent callers
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._save_lock = asyncio.Lock()
+        # mtime of the file when it was last loaded or saved by us, None if unknown
+        self._file_mtime: Optional[int] = None
     
     async def initialize(self):
         """Async initialization"""
         await self.load_sites()
     
-    async def load_sites(self):
-        """Async loads sites from JSON file"""
+    async def load_sites(self, create: bool = True):
+        """Async loads sites from JSON file, a missing file is created empty unless `create` is False"""
         try:
-            async with aiofiles.open(SITES_FILE, 'r', encoding='utf-8') as f:
+            async with aiofiles.open(self.sites_file, 'r', encoding='utf-8') as f:
                 content = await f.read()
                 self.sites = json.loads(content)
         except FileNotFoundError:
             self.sites = {}
-            await self.save_sites()
+            if create:
+                await self.save_sites()
+        self._file_mtime = self._get_file_mtime()
+        self._rebuild_tag_index()
+    
+    def _get_file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.sites_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    async def reload_if_changed(self) -> bool:
+        """Reloads sites only if the file was changed by someone else since we last loaded or saved it"""
+        if self._file_mtime is not None and self._get_file_mtime() == self._file_mtime:
+            return False
+        await self.load_sites()
+        return True
+    
+    def _rebuild_tag_index(self):
+        """Builds tag index from scratch (after loading sites)"""
+        self.tag_index = {}
+        for name, info in self.sites.items():
+            self._index_tags(name, info.get("tags", []))
+    
+    def _index_tags(self, name: str, tags: Iterable[str]):
+        for tag in tags:
+            self.tag_index.setdefault(tag, set()).add(name)
+    
+    def _unindex_tags(self, name: str, tags: Iterable[str]):
+        for tag in tags:
+            names = self.tag_index.get(tag)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.tag_index[tag]
     
     async def save_sites(self):
         """Async saves sites to JSON file"""
-        async with aiofiles.open(SITES_FILE, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(self.sites, ensure_ascii=False, indent=2))
+        async with self._save_lock:
+            async with aiofiles.open(self.sites_file, 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(self.sites, ensure_ascii=False, indent=2))
+            self._file_mtime = self._get_file_mtime()
     
-    async def add_site(self, name: str, url: str, user_id: int, expected_content_type: str = "text/html") -> bool:
+    async def add_site(self, name: str, url: str, user_id: int, expected_content_type: str = "text/html",
+                       tags: Optional[List[str]] = None) -> bool:
         """Async adds new site for monitoring"""
         if name in self.sites:
             return False
+        tags = normalize_tags(tags or [])
         
         self.sites[name] = {
             "url": url,
@@ -50,15 +125,19 @@ class SiteMonitor:
             "last_status": None,
             "last_response_time": None,
             "is_up": True,
-            "last_content_type": None
+            "last_content_type": None,
+            "tags": tags
         }
+        self._index_tags(name, tags)
         await self.save_sites()
         return True
     
     async def remove_site(self, name: str) -> bool:
         """Async removes site from monitoring"""
         if name in self.sites:
+            self._unindex_tags(name, self.sites[name].get("tags", []))
             del self.sites[name]
+            self.result_cache.pop(name, None)
             await self.save_sites()
             return True
         return False
@@ -67,27 +146,79 @@ class SiteMonitor:
         """Returns all sites (sync method for compatibility)"""
         return self.sites
     
+    def get_tags(self) -> Dict[str, List[str]]:
+        """Returns all tags with sorted names of their sites"""
+        return {tag: sorted(names) for tag, names in sorted(self.tag_index.items())}
+    
+    def get_names_by_tag(self, tag: str) -> List[str]:
+        """Returns sorted names of sites with a tag (empty list for unknown tag)"""
+        return sorted(self.tag_index.get(normalize_tag(tag), ()))
+    
+    async def tag_sites(self, names: Iterable[str], add: Iterable[str] = (), remove: Iterable[str] = ()) -> List[str]:
+        """Bulk edits tags of several sites with one save, returns names that were not found"""
+        add, remove = normalize_tags(add), normalize_tags(remove)
+        missing = []
+        for name in names:
+            info = self.sites.get(name)
+            if info is None:
+                missing.append(name)
+                continue
+            tags = info.get("tags", [])
+            self._unindex_tags(name, tags)
+            tags = [tag for tag in tags if tag not in remove]
+            tags += [tag for tag in add if tag not in tags]
+            info["tags"] = tags
+            self._index_tags(name, tags)
+        await self.save_sites()
+        return missing
+    
 
     
-    async def check_site(self, name: str, url: str, proxy_manager: ProxyManager) -> Dict:
-        """Checks availability of one site"""
+    async def set_site_regions(self, name: str, regions: List[str]) -> bool:
+        """Sets list of countries the site is checked from (empty list - any proxy)"""
+        if name not in self.sites:
+            return False
+        self.sites[name]["regions"] = [region.lower() for region in regions]
+        await self.save_sites()
+        return True
+    
+    def get_check_settings(self, name: str) -> Dict:
+        """Returns timeouts (seconds) and retries of a site with defaults applied"""
+        site = self.sites.get(name, {})
+        timeouts = site.get("timeouts") or {}
+        return {
+            "total": timeouts.get("total") or PROBE_TIMEOUT,
+            "connect": timeouts.get("connect"),
+            "read": timeouts.get("read"),
+            "retries": site.get("retries", DEFAULT_RETRIES),
+        }
+    
+    async def set_check_settings(self, name: str, total: Optional[float] = None, connect: Optional[float] = None,
+                                 read: Optional[float] = None, retries: Optional[int] = None) -> bool:
+        """Sets per-site timeouts and retries, None keeps the current value"""
+        if name not in self.sites:
+            return False
+        timeouts = self.sites[name].setdefault("timeouts", {})
+        for key, value in (("total", total), ("connect", connect), ("read", read)):
+            if value is not None:
+                timeouts[key] = value
+        if retries is not None:
+            self.sites[name]["retries"] = retries
+        await self.save_sites()
+        return True
+    
+    async def probe_site(self, name: str, url: str, proxy_url: Optional[str] = None,
+                         timeout: Optional[float] = None) -> Dict:
+        """Makes one HTTP request to the site and returns its status without updating state"""
         try:
-            # Get random proxy for each check
-            proxy_url = None
-            proxy = proxy_manager.get_random_proxy()
-            if proxy:
-                proxy_url = proxy["proxy_url"]
-            
-            # Session settings with more secure SSL configuration
-            timeout = aiohttp.ClientTimeout(total=10)
+            settings = self.get_check_settings(name)
+            timeout = aiohttp.ClientTimeout(
+                total=timeout or settings["total"],
+                sock_connect=settings["connect"],
+                sock_read=settings["read"]
+            )
             
-            # Create SSL context that accepts self-signed certificates
-            # but doesn't disable SSL completely
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
+            connector = aiohttp.TCPConnector(ssl=get_ssl_context(verify=False))
             
             async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
                 # Request settings
@@ -116,6 +247,7 @@ class SiteMonitor:
                     is_up = response.status < 400 and content_type_matches
                     
                     status_info = {
+                        "probe": PROBE_HTTP,
                         "status_code": response.status,
                         "is_up": is_up,
                         "checked_at": datetime.now().isoformat(),
@@ -125,60 +257,250 @@ class SiteMonitor:
                         "expected_content_type": expected_content_type,
                         "content_type_matches": content_type_matches
                     }
-                    
-                    # Update site information
-                    if name in self.sites:
-                        self.sites[name]["last_check"] = status_info["checked_at"]
-                        self.sites[name]["last_status"] = status_info["status_code"]
-                        self.sites[name]["last_response_time"] = response_time
-                        self.sites[name]["is_up"] = is_up
-                        self.sites[name]["last_content_type"] = content_type
-                        await self.save_sites()
-                    
-                    # Update proxy statistics
-                    if proxy_url:
-                        proxy_name = next((name for name, info in proxy_manager.proxies.items() 
-                                         if info["proxy_url"] == proxy_url), None)
-                        if proxy_name:
-                            await proxy_manager.update_proxy_stats(proxy_name, True)
-                    
+                    if not is_up:
+                        status_info["error_type"] = ERROR_HTTP
                     return status_info
         except Exception as e:
             logger.error(f"Error checking {url}: {e}")
-            status_info = {
+            return {
+                "probe": PROBE_HTTP,
                 "status_code": None,
                 "is_up": False,
                 "checked_at": datetime.now().isoformat(),
                 "response_time": None,
-                "error": str(e),
+                "error": str(e) or type(e).__name__,
+                "error_type": classify_error(e),
                 "proxy_used": proxy_url
             }
+    
+    async def probe_with_retries(self, name: str, probe: Callable[[float], Awaitable[Dict]]) -> Dict:
+        """Runs `probe(timeout)` and retries transient failures while the site deadline allows.
+        
+        The site `total` timeout is a deadline for all attempts together, every attempt
+        gets the remaining budget. Backoff is exponential with full jitter.
+        """
+        settings = self.get_check_settings(name)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings["total"]
+        attempt = 0
+        result = await probe(settings["total"])
+        while True:
+            result["attempts"] = attempt + 1
+            if result["is_up"] or attempt >= settings["retries"] or not is_retryable(result):
+                return result
             
-            if name in self.sites:
-                self.sites[name]["last_check"] = status_info["checked_at"]
-                self.sites[name]["last_status"] = None
-                self.sites[name]["last_response_time"] = None
-                self.sites[name]["is_up"] = False
-                self.sites[name]["last_content_type"] = None
-                await self.save_sites()
+            backoff = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+            if deadline - loop.time() - backoff < MIN_ATTEMPT_TIME:
+                return result
+            await asyncio.sleep(backoff)
+            # Never run past the deadline: the sleep may have overshot
+            remaining = deadline - loop.time()
+            if remaining < MIN_ATTEMPT_TIME:
+                return result
+            attempt += 1
+            result = await probe(remaining)
+    
+    async def _record_proxy_result(self, proxy_manager: ProxyManager, result: Dict, save: bool):
+        """Counts a response as proxy success and only proxy-class errors as proxy failures"""
+        proxy_url = result.get("proxy_used")
+        if not proxy_url:
+            return
+        if result.get("status_code") is not None:
+            success = True
+        elif result.get("error_type") == ERROR_PROXY:
+            success = False
+        else:
+            return
+        proxy_name = proxy_manager.get_proxy_name(proxy_url)
+        if proxy_name:
+            await proxy_manager.update_proxy_stats(proxy_name, success, save=save)
+    
+    async def _probe_via_random_proxy(self, name: str, url: str, proxy_manager: ProxyManager, save: bool,
+                                      timeout: float) -> Dict:
+        """One attempt through a random proxy (a new one for each attempt), or directly if there are none"""
+        proxy_url = None
+        proxy = proxy_manager.get_random_proxy()
+        if proxy:
+            proxy_url = proxy["proxy_url"]
+        result = await self.probe_site(name, url, proxy_url, timeout)
+        await self._record_proxy_result(proxy_manager, result, save)
+        return result
+    
+    async def probe_regions(self, name: str, url: str, regions: List[str], proxy_manager: ProxyManager,
+                            save: bool = True) -> Dict:
+        """Probes the site from every region in parallel through a proxy from that country.
+        
+        The site is up only if it is up from every region that has a proxy. Regions without
+        an active proxy are reported as unknown (is_up None) and don't affect the decision;
+        if no region has a proxy, the site is checked like a site without regions.
+        The returned status is the one of the first failing region (or the first region)
+        plus a `regions` matrix.
+        """
+        async def probe_region(region: str) -> Dict:
+            proxy = proxy_manager.get_proxy_by_country(region)
+            if not proxy:
+                logger.warning(f"No active proxy for region {region.upper()}, {name} is not checked from it")
+                return {
+                    "probe": PROBE_HTTP,
+                    "status_code": None,
+                    "is_up": None,
+                    "checked_at": datetime.now().isoformat(),
+                    "response_time": None,
+                    "error": f"No active proxy for region {region.upper()}",
+                    "error_type": ERROR_PROXY,
+                    "proxy_used": None
+                }
+            
+            async def attempt(timeout: float) -> Dict:
+                result = await self.probe_site(name, url, proxy["proxy_url"], timeout)
+                await self._record_proxy_result(proxy_manager, result, save)
+                return result
             
-            # Update proxy statistics on error
-            if proxy_url:
-                proxy_name = next((name for name, info in proxy_manager.proxies.items() 
-                                 if info["proxy_url"] == proxy_url), None)
-                if proxy_name:
-                    await proxy_manager.update_proxy_stats(proxy_name, False)
+            return await self.probe_with_retries(name, attempt)
+        
+        results = await asyncio.gather(*(probe_region(region) for region in regions))
+        matrix = dict(zip(regions, results))
+        
+        known = [result for result in results if result["is_up"] is not None]
+        if known:
+            status_info = dict(next((result for result in known if not result["is_up"]), known[0]))
+            status_info["is_up"] = all(result["is_up"] for result in known)
+        else:
+            status_info = dict(await self.probe_with_retries(name, lambda timeout: self._probe_via_random_proxy(
+                name, url, proxy_manager, save, timeout
+            )))
+        status_info["regions"] = {
+            region: {
+                "is_up": result["is_up"],
+                "status_code": result.get("status_code"),
+                "response_time": result.get("response_time"),
+                "error": result.get("error"),
+                "error_type": result.get("error_type"),
+                "proxy_used": result.get("proxy_used")
+            }
+            for region, result in matrix.items()
+        }
+        return status_info
+    
+    async def check_site(self, name: str, url: str, proxy_manager: ProxyManager, save: bool = True) -> Dict:
+        """Checks availability of one site"""
+        probe_type = get_probe_type(url)
+        regions = self.sites.get(name, {}).get("regions") or []
+        if probe_type != PROBE_HTTP:
+            # Lightweight probes connect directly, without proxies
+            regions = []
+            status_info = await self.probe_with_retries(name, lambda timeout: PROBES[probe_type](url, timeout))
+        elif regions:
+            status_info = await self.probe_regions(name, url, regions, proxy_manager, save)
+        else:
+            status_info = await self.probe_with_retries(name, lambda timeout: self._probe_via_random_proxy(
+                name, url, proxy_manager, save, timeout
+            ))
+        
+        # Update site information
+        if name in self.sites:
+            self.sites[name]["last_check"] = status_info["checked_at"]
+            self.sites[name]["last_status"] = status_info["status_code"]
+            self.sites[name]["last_response_time"] = status_info["response_time"]
+            self.sites[name]["is_up"] = status_info["is_up"]
+            self.sites[name]["last_content_type"] = status_info.get("content_type")
+            self.sites[name]["last_error_type"] = status_info.get("error_type")
+            if "cert_days_left" in status_info:
+                self.sites[name]["cert_expires_at"] = status_info["cert_expires_at"]
+                self.sites[name]["cert_days_left"] = status_info["cert_days_left"]
+            if regions:
+                self.sites[name]["last_regions"] = {
+                    region: {"is_up": result["is_up"], "response_time": result["response_time"]}
+                    for region, result in status_info["regions"].items()
+                }
+            if save:
+                await self.save_sites()
+        
+        self.result_cache[name] = (time.monotonic(), status_info)
+        return status_info
+    
+    async def check_site_shared(self, name: str, url: str, proxy_manager: ProxyManager, save: bool = True) -> Dict:
+        """Checks one site, concurrent callers for the same site share a single check"""
+        task = self._in_flight.get(name)
+        if task is None:
+            task = asyncio.create_task(self.check_site(name, url, proxy_manager, save))
+            self._in_flight[name] = task
             
-            return status_info
+            def forget(_):
+                if self._in_flight.get(name) is task:
+                    del self._in_flight[name]
+            task.add_done_callback(forget)
+        # Shielded: a cancelled caller must not cancel the check other callers wait for
+        return dict(await asyncio.shield(task))
     
-    async def check_all_sites(self, proxy_manager: ProxyManager) -> List[Dict]:
-        """Checks availability of all sites"""
-        await self.load_sites()
+    def get_cached_result(self, name: str, max_age: float) -> Optional[Dict]:
+        """Returns copy of the latest result of a site if it is not older than `max_age` seconds"""
+        cached = self.result_cache.get(name)
+        if cached is None:
+            return None
+        age = time.monotonic() - cached[0]
+        if age > max_age:
+            return None
+        result = dict(cached[1])
+        result["cache_age"] = round(age, 1)
+        return result
+    
+    async def _check_named_site(self, name: str, url: str, proxy_manager: ProxyManager,
+                                semaphore: asyncio.Semaphore, max_age: Optional[float] = None) -> Dict:
+        """Checks one site under the sweep semaphore (or reuses a fresh result) and tags the result with its name"""
+        result = self.get_cached_result(name, max_age) if max_age else None
+        if result is None:
+            async with semaphore:
+                result = await self.check_site_shared(name, url, proxy_manager, save=False)
+        result["name"] = name
+        result["url"] = url
+        return result
+    
+    async def iter_check_sites(self, proxy_manager: ProxyManager, concurrency: Optional[int] = None,
+                               save: bool = True, reload: bool = True,
+                               names: Optional[Iterable[str]] = None,
+                               max_age: Optional[float] = None) -> AsyncIterator[Dict]:
+        """Checks all sites (or only `names`) concurrently and yields results as soon as they are ready.
         
-        results = []
-        for name, site_info in self.sites.items():
-            result = await self.check_site(name, site_info["url"], proxy_manager)
-            result["name"] = name
-            result["url"] = site_info["url"]
-            results.append(result)
-        return results 
\ No newline at end of file
+        With `max_age`, results not older than `max_age` seconds are reused instead of checking again.
+        """
+        if reload:
+            await self.load_sites()
+        if names is None:
+            names = list(self.sites)
+        
+        semaphore = asyncio.Semaphore(concurrency or DEFAULT_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(
+                self._check_named_site(name, self.sites[name]["url"], proxy_manager, semaphore, max_age)
+            )
+            for name in names
+            if name in self.sites
+        ]
+        checked = False
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                checked = checked or "cache_age" not in result
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Persist once per sweep instead of once per site (nothing changed if every result was cached)
+            if save and tasks and (checked or not max_age):
+                await self.save_sites()
+                await proxy_manager.save_proxies()
+    
+    async def check_all_sites(self, proxy_manager: ProxyManager, concurrency: Optional[int] = None,
+                              save: bool = True, reload: bool = True,
+                              names: Optional[Iterable[str]] = None,
+                              max_age: Optional[float] = None) -> List[Dict]:
+        """Checks availability of all sites (or only `names`), reusing results not older than `max_age`"""
+        results = [
+            result async for result in self.iter_check_sites(
+                proxy_manager, concurrency, save, reload, names, max_age
+            )
+        ]
+        order = {name: i for i, name in enumerate(self.sites)}
+        results.sort(key=lambda result: order.get(result["name"], len(order)))
+        return results
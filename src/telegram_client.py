@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import DeleteMessage, EditMessageText, SendMessage, TelegramMethod
+
+from src import config
+from src.logger import logger
+
+# Priority lanes: lower value is sent first
+PRIORITY_ALERT = 0
+PRIORITY_REPLY = 1
+PRIORITY_REPORT = 2
+
+# Burst of every bucket: with one token, no one-second window holds more than `rate` requests
+BUCKET_CAPACITY = 1.0
+
+
+class TokenBucket:
+    """Token bucket with `rate` tokens per second and `capacity` burst"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Returns seconds until one token is available (0 if available now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        """Takes one token, wait_time() must have returned 0 before"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float):
+        """Blocks the bucket until the given monotonic time (retry-after)"""
+        self.blocked_until = max(self.blocked_until, until)
+        # Start refilling only after the block ends, so there is no burst right after it
+        self.tokens = 0
+        self.updated_at = self.blocked_until
+
+
+class _Job:
+    def __init__(self, priority: int, seq: int, chat_id: Any, method: TelegramMethod, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.future = future
+        self.attempts = 0
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class TelegramSender:
+    """Single outbound queue for all Telegram API calls.
+
+    Requests are ordered by priority lane, paced by a global token bucket and
+    a per-chat token bucket, and retried after TelegramRetryAfter errors.
+    Messages to the same chat are never sent concurrently, so their order is kept.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = None, chat_rate: float = None,
+                 group_rate: float = None, max_retries: int = None):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate or config.TELEGRAM_GLOBAL_RATE, BUCKET_CAPACITY)
+        self.chat_rate = chat_rate or config.TELEGRAM_CHAT_RATE
+        self.group_rate = group_rate or config.TELEGRAM_GROUP_RATE
+        self.max_retries = max_retries if max_retries is not None else config.TELEGRAM_MAX_RETRIES
+        self.chat_buckets: Dict[Any, TokenBucket] = {}
+        self.stats = {"sent": 0, "retry_after": 0, "failed": 0}
+        self._pending: List[_Job] = []
+        self._in_flight: set = set()
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Group chats (negative ids) have a much stricter limit
+            rate = self.group_rate if str(chat_id).startswith("-") else self.chat_rate
+            bucket = TokenBucket(rate, BUCKET_CAPACITY)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _pick(self, now: float) -> Tuple[Optional[_Job], float]:
+        """Returns the first sendable job in priority order, or the time to wait"""
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        min_wait = None
+        for job in sorted(self._pending):
+            if job.chat_id in self._in_flight:
+                continue
+            wait = self._chat_bucket(job.chat_id).wait_time(now)
+            if wait == 0:
+                return job, 0.0
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            job, wait = self._pick(now)
+            if job is None:
+                # Nothing sendable right now, sleep until a bucket refills or a new job arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._pending.remove(job)
+            heapq.heapify(self._pending)
+            self.global_bucket.consume(now)
+            self._chat_bucket(job.chat_id).consume(now)
+            self._in_flight.add(job.chat_id)
+            task = asyncio.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: _Job):
+        try:
+            result = await self.bot(job.method)
+            self.stats["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        except TelegramRetryAfter as e:
+            self.stats["retry_after"] += 1
+            job.attempts += 1
+            logger.warning(f"Telegram flood control for chat {job.chat_id}, retry after {e.retry_after}s")
+            # Only this chat waits: the global bucket keeps pacing, so alerts to other chats aren't held up
+            self._chat_bucket(job.chat_id).block(time.monotonic() + e.retry_after)
+            if job.attempts > self.max_retries:
+                self.stats["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                heapq.heappush(self._pending, job)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._in_flight.discard(job.chat_id)
+            self._wakeup.set()
+
+    def submit(self, method: TelegramMethod, priority: int = PRIORITY_REPLY) -> asyncio.Future:
+        """Queues an API method and returns a future with its result"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(priority, next(self._seq), getattr(method, "chat_id", None), method, future)
+        heapq.heappush(self._pending, job)
+        self._wakeup.set()
+        return future
+
+    async def request(self, method: TelegramMethod, priority: int = PRIORITY_REPLY):
+        """Sends an API method through the limiter and waits for its result"""
+        return await self.submit(method, priority)
+
+    async def send_message(self, chat_id, text: str, priority: int = PRIORITY_REPLY, **kwargs):
+        """Sends a message through the limiter"""
+        return await self.request(SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    def queue_message(self, chat_id, text: str, priority: int = PRIORITY_ALERT, **kwargs) -> asyncio.Future:
+        """Queues a message without waiting for delivery, failures are logged"""
+        future = self.submit(SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    async def edit_message_text(self, chat_id, message_id: int, text: str, priority: int = PRIORITY_REPLY, **kwargs):
+        """Edits a message through the limiter"""
+        return await self.request(EditMessageText(chat_id=chat_id, message_id=message_id, text=text, **kwargs), priority)
+
+    async def delete_message(self, chat_id, message_id: int, priority: int = PRIORITY_REPLY):
+        """Deletes a message through the limiter"""
+        return await self.request(DeleteMessage(chat_id=chat_id, message_id=message_id), priority)
+
+    def pending_messages(self, priority: int = PRIORITY_ALERT) -> List[Dict]:
+        """Returns queued (not delivered) messages of a priority lane, for persisting"""
+        return [
+            {"chat_id": job.method.chat_id, "text": job.method.text, "parse_mode": job.method.parse_mode}
+            for job in sorted(self._pending)
+            if job.priority == priority and isinstance(job.method, SendMessage)
+        ]
+
+    def resubmit(self, messages: List[Dict], priority: int = PRIORITY_ALERT):
+        """Queues messages restored from a snapshot without waiting for delivery"""
+        for message in messages:
+            self.queue_message(priority=priority, **message)
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception():
+            logger.error(f"Error sending queued message: {future.exception()}")
+
+    def pending_count(self) -> int:
+        """Returns number of queued requests"""
+        return len(self._pending)
+
+    async def wait_idle(self, timeout: float = 10, poll: float = 0.1) -> bool:
+        """Waits until queued requests are sent, returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+        return not (self._pending or self._in_flight)
+
+    async def close(self, timeout: float = 10):
+        """Waits for queued requests to be sent and stops the worker"""
+        await self.wait_idle(timeout)
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+
+def create_bot() -> Bot:
+    """Creates bot, optionally pointed at a custom Bot API server"""
+    session = None
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+    return Bot(token=config.BOT_TOKEN, session=session, parse_mode="HTML")
+
+
+# Shared bot and sender for the whole process
+bot = create_bot()
+sender = TelegramSender(bot)
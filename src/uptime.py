@@ -0,0 +1,173 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiofiles
+
+from src.logger import logger
+
+# File for storing uptime rollups
+UPTIME_FILE = "./data/uptime.json"
+
+# Bucket sizes in seconds and how many buckets of each size are kept
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+RETENTION = {
+    "m": (MINUTE, 120),    # last 2 hours by minute
+    "h": (HOUR, 8 * 24),   # last 8 days by hour
+    "d": (DAY, 90),        # last 90 days by day
+}
+INCIDENTS_RETENTION = 90 * DAY
+
+# Bucket levels from the finest to the coarsest
+LEVELS = ["m", "h", "d"]
+
+# Report periods: name -> (seconds, bucket level used for the uptime percentage)
+PERIODS = {
+    "1h": (HOUR, "m"),
+    "24h": (DAY, "h"),
+    "7d": (7 * DAY, "h"),
+    "30d": (30 * DAY, "d"),
+}
+
+
+class UptimeTracker:
+    """Per-site availability counters rolled up by minute, hour and day.
+
+    Every check result increments one counter at each level (O(1)), old buckets
+    are dropped as new ones are created. Incidents (down periods) are kept as
+    [start, end] pairs to compute downtime and MTTR.
+    """
+
+    def __init__(self, uptime_file: str = UPTIME_FILE):
+        self.uptime_file = uptime_file
+        self.data: Dict[str, Dict] = {}
+
+    async def initialize(self):
+        """Async initialization"""
+        await self.load()
+
+    async def load(self):
+        """Async loads rollups from JSON file"""
+        try:
+            async with aiofiles.open(self.uptime_file, 'r', encoding='utf-8') as f:
+                content = await f.read()
+                self.data = json.loads(content)
+        except FileNotFoundError:
+            self.data = {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Error reading uptime file, starting from scratch: {e}")
+            self.data = {}
+
+    async def save(self):
+        """Async saves rollups to JSON file"""
+        async with aiofiles.open(self.uptime_file, 'w', encoding='utf-8') as f:
+            await f.write(json.dumps(self.data, separators=(',', ':')))
+
+    def _site(self, name: str) -> Dict:
+        site = self.data.get(name)
+        if site is None:
+            site = {"m": {}, "h": {}, "d": {}, "incidents": []}
+            self.data[name] = site
+        return site
+
+    def record(self, name: str, is_up: bool, timestamp: Optional[float] = None):
+        """Adds one check result to the site counters"""
+        now = int(timestamp if timestamp is not None else time.time())
+        site = self._site(name)
+
+        for level, (size, keep) in RETENTION.items():
+            buckets = site[level]
+            key = str(now // size)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [0, 0]
+                # Buckets are created in time order, so the oldest are at the front
+                cutoff = now // size - keep
+                while buckets:
+                    oldest = next(iter(buckets))
+                    if int(oldest) > cutoff:
+                        break
+                    del buckets[oldest]
+            bucket[0] += 1
+            if is_up:
+                bucket[1] += 1
+
+        incidents = site["incidents"]
+        open_incident = incidents and incidents[-1][1] is None
+        if not is_up and not open_incident:
+            incidents.append([now, None])
+            while incidents and incidents[0][1] is not None and incidents[0][1] < now - INCIDENTS_RETENTION:
+                incidents.pop(0)
+        elif is_up and open_incident:
+            incidents[-1][1] = now
+
+    def remove_site(self, name: str):
+        """Drops all rollups of a site"""
+        self.data.pop(name, None)
+
+    def _count(self, site: Dict, level: str, start: int, end: Optional[int], now: int) -> Tuple[float, float]:
+        """Returns (checks, up checks) in [start, end) from buckets of a level (end None - up to now).
+
+        The bucket straddling `start` is taken from the next finer level while it is still
+        retained there, otherwise its counters are pro-rated by the covered part of the bucket.
+        """
+        size = RETENTION[level][0]
+        first_key = start // size
+        last_key = end // size if end is not None else None
+
+        checks = up = 0.0
+        for key, (bucket_checks, bucket_up) in site[level].items():
+            key = int(key)
+            if key > first_key and (last_key is None or key < last_key):
+                checks += bucket_checks
+                up += bucket_up
+
+        boundary = site[level].get(str(first_key))
+        if boundary is None:
+            return checks, up
+        boundary_end = (first_key + 1) * size
+        if start == first_key * size:
+            return checks + boundary[0], up + boundary[1]
+
+        finer_index = LEVELS.index(level) - 1
+        if finer_index >= 0:
+            finer = LEVELS[finer_index]
+            finer_size, finer_keep = RETENTION[finer]
+            if start // finer_size > now // finer_size - finer_keep:
+                finer_checks, finer_up = self._count(site, finer, start, boundary_end, now)
+                return checks + finer_checks, up + finer_up
+
+        fraction = (boundary_end - start) / size
+        return checks + boundary[0] * fraction, up + boundary[1] * fraction
+
+    def get_report(self, name: str, period: str = "24h", timestamp: Optional[float] = None) -> Optional[Dict]:
+        """Returns uptime %, incidents, MTTR and downtime of a site for a period"""
+        site = self.data.get(name)
+        if site is None:
+            return None
+
+        now = int(timestamp if timestamp is not None else time.time())
+        seconds, level = PERIODS[period]
+        period_start = now - seconds
+        checks, up = self._count(site, level, period_start, None, now)
+        downtime = 0
+        incidents: List[List] = []
+        for start, end in site["incidents"]:
+            effective_end = end if end is not None else now
+            if effective_end <= period_start:
+                continue
+            incidents.append([start, end])
+            downtime += effective_end - max(start, period_start)
+
+        resolved = [end - start for start, end in incidents if end is not None]
+        return {
+            "period": period,
+            "checks": round(checks),
+            "uptime": round(up / checks * 100, 3) if checks else None,
+            "incidents": len(incidents),
+            "mttr": round(sum(resolved) / len(resolved)) if resolved else None,
+            "downtime": downtime,
+            "is_down": bool(site["incidents"]) and site["incidents"][-1][1] is None,
+        }
@@ -0,0 +1,66 @@
+import asyncio
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from src import config
+from src.logger import logger
+
+
+def create_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """Creates aiohttp application, receiving Telegram updates if webhook mode is on"""
+    app = web.Application()
+    if config.WEBHOOK_URL:
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=config.WEBHOOK_SECRET or None,
+        ).register(app, path=config.WEBHOOK_PATH)
+        setup_application(app, dp, bot=bot)
+    return app
+
+
+async def start_web_app(app: web.Application) -> web.AppRunner:
+    """Starts serving the application on WEBAPP_HOST:WEBAPP_PORT, returns runner for cleanup"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
+    await site.start()
+    logger.info(f"Web server listening on {config.WEBAPP_HOST}:{config.WEBAPP_PORT}")
+    return runner
+
+
+def _wait_for_shutdown_signal() -> asyncio.Event:
+    """Returns event that is set on SIGTERM/SIGINT"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Signal handlers are not available on this platform
+            pass
+    return stop_event
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, app: web.Application = None):
+    """Serves webhook updates on the current event loop until SIGTERM/SIGINT"""
+    app = app or create_app(dp, bot)
+    runner = await start_web_app(app)
+
+    webhook_url = config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH
+    # Pending updates are kept: Telegram buffers them while the bot restarts
+    await bot.set_webhook(
+        url=webhook_url,
+        secret_token=config.WEBHOOK_SECRET or None,
+    )
+    logger.info(f"Webhook set to {webhook_url}")
+
+    try:
+        await _wait_for_shutdown_signal().wait()
+    finally:
+        logger.info("Stopping webhook server...")
+        # The webhook is kept registered so Telegram buffers updates during restarts
+        await runner.cleanup()
@@ -0,0 +1,108 @@
+"""
+Remote probe agents against a local central instance: several agents check a local site,
+push results, and the central aggregator merges them with the local result.
+"""
+
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from src.agents import AgentAggregator, POLICY_MAJORITY, RESULT_FIELDS, run_agent, setup_agent_routes
+from src.site_monitor import SiteMonitor
+
+TOKEN = "agent-token"
+AGENTS = ["fra1", "nyc1", "sgp1"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_app(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run_agents_scenario(tmp_path) -> dict:
+    # Monitored site
+    site_app = web.Application()
+
+    async def index(request: web.Request) -> web.Response:
+        return web.Response(text="ok", content_type="text/html")
+
+    site_app.router.add_get("/", index)
+    site_port = free_port()
+    site_runner = await start_app(site_app, site_port)
+
+    # Central instance with the agent API
+    site_monitor = SiteMonitor(str(tmp_path / "sites.json"))
+    site_monitor.sites = {"local": {"url": f"http://127.0.0.1:{site_port}/", "is_up": True}}
+    aggregator = AgentAggregator(result_ttl=60, policy=POLICY_MAJORITY)
+    central_app = web.Application()
+    setup_agent_routes(central_app, aggregator, site_monitor, TOKEN)
+    central_port = free_port()
+    central_runner = await start_app(central_app, central_port)
+    central_url = f"http://127.0.0.1:{central_port}"
+
+    outcome = {}
+    agents = [
+        asyncio.create_task(run_agent(central_url, TOKEN, name, interval=60, concurrency=5))
+        for name in AGENTS
+    ]
+    try:
+        for _ in range(100):
+            if len(aggregator.get_fresh_reports("local")) == len(AGENTS):
+                break
+            await asyncio.sleep(0.1)
+        outcome["reports"] = aggregator.get_fresh_reports("local")
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{central_url}/agent/sites", headers={"Authorization": "Bearer wrong"}) as response:
+                outcome["wrong_token"] = response.status
+            async with session.get(f"{central_url}/agent/sites") as response:
+                outcome["missing_token"] = response.status
+            payload = {"agent": "rogue", "fields": RESULT_FIELDS, "results": [["made-up", 1, 1.0, 200, None, None]]}
+            async with session.post(f"{central_url}/agent/results", json=payload,
+                                    headers={"Authorization": f"Bearer {TOKEN}"}) as response:
+                outcome["unknown_site"] = await response.json()
+    finally:
+        for agent in agents:
+            agent.cancel()
+        await asyncio.gather(*agents, return_exceptions=True)
+        await central_runner.cleanup()
+        await site_runner.cleanup()
+
+    # The central instance's own network is down: agents outvote it
+    results = [{"name": "local", "is_up": False}]
+    aggregator.merge_results(results, site_monitor.get_sites(), {"local": {"is_up": True}})
+    outcome["merged"] = results[0]
+    outcome["known_names"] = set(aggregator.reports)
+    return outcome
+
+
+def test_agents_push_results_and_outvote_local_outage(tmp_path):
+    outcome = asyncio.run(run_agents_scenario(tmp_path))
+
+    assert set(outcome["reports"]) == set(AGENTS)
+    assert all(report["is_up"] for report in outcome["reports"].values())
+
+    assert outcome["wrong_token"] == 401
+    assert outcome["missing_token"] == 401
+    assert outcome["unknown_site"] == {"accepted": 0, "ignored": 1}
+    assert outcome["known_names"] == {"local"}
+
+    assert outcome["merged"]["is_up"] is True
+    assert outcome["merged"]["local_is_up"] is False
+    assert outcome["merged"]["vantage_points"] == {"local": False, "fra1": True, "nyc1": True, "sgp1": True}
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AgentAggregator(policy="majorty")
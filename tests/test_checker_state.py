@@ -0,0 +1,62 @@
+"""
+Per-site schedule of the periodic checker: sites are spread over the interval on a cold start
+and after a restart, instead of being checked all at once.
+"""
+
+import asyncio
+import json
+import time
+
+from src.checker_state import CheckerState
+
+INTERVAL = 300
+TICK = 5
+SITES = {f"site{i:03d}": {"is_up": True} for i in range(100)}
+
+
+def run_ticks(state: CheckerState, start: float, duration: float) -> list:
+    """Calls take_due() every TICK seconds up to `duration` inclusive, returns the due names of every tick"""
+    return [
+        state.take_due(SITES, start + offset, INTERVAL, alert_threshold=1)
+        for offset in range(0, int(duration) + 1, TICK)
+    ]
+
+
+def test_cold_start_spreads_sites_over_the_interval():
+    state = CheckerState()
+    ticks = run_ticks(state, time.time(), 2 * INTERVAL)
+
+    assert max(len(due) for due in ticks) < len(SITES) / 10
+    # Every site is checked once per interval
+    checked = [name for due in ticks for name in due]
+    assert sorted(checked) == sorted(list(SITES) * 2)
+
+
+def test_sites_missed_during_downtime_are_spread_over_the_next_interval(tmp_path):
+    # The bot went down for a whole interval: every site became due while it was down
+    down_at = time.time() - INTERVAL
+    snapshot = {
+        "saved_at": down_at,
+        "next_due": {name: down_at + i * INTERVAL / len(SITES) for i, name in enumerate(SITES)},
+    }
+    state_file = tmp_path / "checker_state.json"
+    state_file.write_text(json.dumps(snapshot))
+    state = CheckerState(str(state_file))
+    asyncio.run(state.load())
+
+    ticks = run_ticks(state, time.time(), INTERVAL)
+
+    assert ticks[0] == []
+    assert max(len(due) for due in ticks) < len(SITES) / 10
+    checked = [name for due in ticks for name in due]
+    assert sorted(checked) == sorted(SITES)
+
+
+def test_site_added_after_restart_is_checked_right_away(tmp_path):
+    state_file = tmp_path / "checker_state.json"
+    state_file.write_text(json.dumps({"next_due": {name: time.time() + INTERVAL for name in SITES}}))
+    state = CheckerState(str(state_file))
+    asyncio.run(state.load())
+
+    sites = dict(SITES, new={"is_up": True})
+    assert state.take_due(sites, time.time(), INTERVAL, alert_threshold=1) == ["new"]
@@ -0,0 +1,50 @@
+"""
+Uptime reports over rollups: the bucket straddling the start of the report window is counted in part.
+"""
+
+from src.uptime import DAY, HOUR, UptimeTracker
+
+# A fixed midnight, so bucket boundaries are predictable
+MIDNIGHT = 1_700_006_400
+
+
+def record_every(tracker: UptimeTracker, step: int, start: int, end: int, down=None):
+    """Records a check every `step` seconds in [start, end), down within the (start, end) pair `down`"""
+    for timestamp in range(start, end, step):
+        is_up = not (down and down[0] <= timestamp < down[1])
+        tracker.record("site", is_up, timestamp)
+
+
+def test_24h_report_counts_the_hour_straddling_the_window_start():
+    tracker = UptimeTracker()
+    # Mid-hour: the window starts in the middle of an hour bucket
+    now = MIDNIGHT + 10 * DAY + 30 * 60
+    record_every(tracker, 300, now - 2 * DAY, now, down=(now - 3 * HOUR, now - 2 * HOUR))
+
+    report = tracker.get_report("site", "24h", now)
+
+    # 12 checks an hour for 24 hours, half of the straddling hour included
+    assert report["checks"] == 288
+    assert report["uptime"] == round(276 / 288 * 100, 3)
+    assert report["incidents"] == 1
+    assert report["downtime"] == HOUR
+
+
+def test_30d_report_counts_the_day_straddling_the_window_start():
+    tracker = UptimeTracker()
+    # Midday: the window starts in the middle of a day bucket
+    now = MIDNIGHT + 60 * DAY + 12 * HOUR
+    record_every(tracker, HOUR, now - 40 * DAY, now)
+
+    report = tracker.get_report("site", "30d", now)
+
+    assert report["checks"] == 30 * 24
+    assert report["uptime"] == 100.0
+
+
+def test_report_aligned_to_bucket_counts_the_whole_first_bucket():
+    tracker = UptimeTracker()
+    now = MIDNIGHT + 10 * DAY
+    record_every(tracker, 300, now - 2 * DAY, now)
+
+    assert tracker.get_report("site", "24h", now)["checks"] == 288
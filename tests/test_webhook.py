@@ -0,0 +1,148 @@
+"""
+Webhook mode against a local fake Bot API server: secret check, update handling and SIGTERM shutdown.
+
+The bot runs as a subprocess (python run.py) with TELEGRAM_API_URL pointing at the fake server.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_ID = 1001
+SECRET = "test-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeBotAPI:
+    """Records Bot API calls and answers them with minimal valid results"""
+
+    def __init__(self):
+        self.calls = []
+        self.changed = asyncio.Event()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        self.calls.append((method, data))
+        self.changed.set()
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "test", "username": "test_bot"}
+        elif method == "sendMessage":
+            result = {
+                "message_id": len(self.calls),
+                "date": int(time.time()),
+                "chat": {"id": int(data["chat_id"]), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def methods(self) -> list:
+        return [method for method, _ in self.calls]
+
+    async def wait_for(self, method: str, timeout: float = 20):
+        deadline = time.monotonic() + timeout
+        while method not in self.methods():
+            self.changed.clear()
+            await asyncio.wait_for(self.changed.wait(), max(0.0, deadline - time.monotonic()))
+
+
+def make_update(update_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": ADMIN_ID, "type": "private"},
+            "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "admin"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+async def run_webhook_scenario(tmp_path) -> dict:
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    api_port, webapp_port = free_port(), free_port()
+    await web.TCPSite(runner, "127.0.0.1", api_port).start()
+
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        BOT_TOKEN="123456:TEST",
+        ADMINS=str(ADMIN_ID),
+        REPORT_CHAT_ID="",
+        AGENT_TOKEN="",
+        TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}",
+        WEBHOOK_URL="https://bot.example.com",
+        WEBHOOK_PATH="/webhook",
+        WEBHOOK_SECRET=SECRET,
+        WEBAPP_HOST="127.0.0.1",
+        WEBAPP_PORT=str(webapp_port),
+    )
+    (tmp_path / "data").mkdir()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "run.py"), cwd=str(tmp_path), env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    outcome = {}
+    try:
+        await api.wait_for("setWebhook")
+        outcome["set_webhook"] = dict(api.calls[api.methods().index("setWebhook")][1])
+
+        url = f"http://127.0.0.1:{webapp_port}/webhook"
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=make_update(1, "/start")) as response:
+                outcome["missing_secret"] = response.status
+            headers = {"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+            async with session.post(url, json=make_update(2, "/start"), headers=headers) as response:
+                outcome["wrong_secret"] = response.status
+            headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+            async with session.post(url, json=make_update(3, "/start"), headers=headers) as response:
+                outcome["valid"] = response.status
+
+        await api.wait_for("sendMessage")
+        outcome["replies"] = [data for method, data in api.calls if method == "sendMessage"]
+
+        process.send_signal(signal.SIGTERM)
+        outcome["returncode"] = await asyncio.wait_for(process.wait(), 20)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        await runner.cleanup()
+    return outcome
+
+
+def test_webhook_mode(tmp_path):
+    outcome = asyncio.run(run_webhook_scenario(tmp_path))
+
+    assert outcome["set_webhook"]["url"] == "https://bot.example.com/webhook"
+    assert outcome["set_webhook"]["secret_token"] == SECRET
+    assert "drop_pending_updates" not in outcome["set_webhook"]
+
+    assert outcome["missing_secret"] == 401
+    assert outcome["wrong_secret"] == 401
+    assert outcome["valid"] == 200
+    # Only the update with the valid secret is handled
+    assert len(outcome["replies"]) == 1
+    assert outcome["replies"][0]["chat_id"] == str(ADMIN_ID)
+
+    assert outcome["returncode"] == 0